@@ -2,19 +2,63 @@
 Manual helper script to exercise the POST /tap endpoint without IDE tooling.
 Usage:
     python manual_tap_test.py --card 1234567890 --tenant 1 --tap-ts 2025-01-01T08:00:00+07:00
+    python manual_tap_test.py --card 1234567890 --tenant 1 --repeat 200 --concurrency 16
+    python manual_tap_test.py --card 1234567890 --tenant 1 --repeat 200 --concurrency 16 --http2
+
+--http2 requires `pip install "httpx[http2]"` and an HTTP/2-capable server in front of
+the API (e.g. hypercorn or a TLS reverse proxy); plain uvicorn only speaks HTTP/1.1.
 """
 
 import argparse
-import json
+import asyncio
+import importlib.util
 import os
+import statistics
 import sys
 import time
-from typing import Optional
+from typing import Any, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ModuleNotFoundError:  # fallback ke stdlib json
+    orjson = None
+    import json
+
+try:
+    import httpx
+except ModuleNotFoundError:
+    httpx = None
 
 DEFAULT_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def dumps_pretty(data: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(data, indent=2)
+
+
+def dumps_bytes(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def loads(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 
 def build_payload(
     card_number: str, tenant_id: int, tap_ts: Optional[str], tap_id: Optional[str]
@@ -30,6 +74,68 @@ def build_payload(
     return payload
 
 
+async def run_load(
+    endpoint: str,
+    card_number: str,
+    tenant_id: int,
+    tap_ts: Optional[str],
+    repeat: int,
+    concurrency: int,
+    http2: bool = False,
+) -> None:
+    """
+    Kirim `repeat` tap dalam batch berukuran `concurrency` lalu cetak persentil RTT.
+    Dengan `http2`, semua tap dimultipleks di atas satu koneksi.
+    """
+    rtts: list[float] = []
+    status_counts: dict[str, int] = {}
+    # Body di-serialize sekali; hanya tap_id yang disisipkan per request.
+    body_prefix = dumps_bytes(build_payload(card_number, tenant_id, tap_ts, None))[:-1]
+    body_prefix += b',"tap_id":'
+    tap_id_prefix = f"{card_number}-"
+    if http2:
+        limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+    else:
+        limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(http2=http2, limits=limits, timeout=10) as client:
+
+        async def _send(index: int) -> None:
+            tap_id = f"{tap_id_prefix}{time.time_ns() // 1_000_000}-{index}"
+            body = body_prefix + dumps_bytes(tap_id) + b"}"
+            t0 = time.perf_counter_ns()
+            try:
+                response = await client.post(
+                    endpoint, content=body, headers=JSON_HEADERS
+                )
+            except httpx.HTTPError as exc:
+                key = f"error:{type(exc).__name__}"
+            else:
+                rtts.append((time.perf_counter_ns() - t0) / 1_000_000)
+                key = str(response.status_code)
+                try:
+                    body = loads(response.content)
+                    if isinstance(body, dict) and body.get("reason"):
+                        key = f"{key}:{body['reason']}"
+                except ValueError:
+                    pass
+            status_counts[key] = status_counts.get(key, 0) + 1
+
+        started = time.perf_counter()
+        for batch_start in range(0, repeat, concurrency):
+            batch_end = min(batch_start + concurrency, repeat)
+            await asyncio.gather(*(_send(i) for i in range(batch_start, batch_end)))
+        elapsed = time.perf_counter() - started
+
+    print(f"\nSent {repeat} taps in {elapsed:.2f}s ({repeat / elapsed:.1f} req/s)")
+    for key, count in sorted(status_counts.items()):
+        print(f"  {key}: {count}")
+    if len(rtts) >= 2:
+        cuts = statistics.quantiles(rtts, n=100)
+        print(f"RTT p50={cuts[49]:.2f}ms p95={cuts[94]:.2f}ms p99={cuts[98]:.2f}ms")
+    elif rtts:
+        print(f"RTT: {rtts[0]:.2f} ms")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Quick manual tester for POST /tap")
     parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="FastAPI base URL")
@@ -50,26 +156,74 @@ def main():
         default=None,
         help="Optional tap_id override (defaults to cardNumber-epochMs)",
     )
+    parser.add_argument(
+        "--repeat",
+        default=1,
+        type=int,
+        help="Number of taps to send (load mode when > 1, requires httpx)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        default=1,
+        type=int,
+        help="Max in-flight taps per batch in load mode",
+    )
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help="Send over HTTP/2 with httpx (multiplexes all taps on one connection)",
+    )
     args = parser.parse_args()
 
     endpoint = args.base_url.rstrip("/") + "/tap"
-    tap_id = args.tap_id or f"{args.card}-{int(time.time() * 1000)}"
+    if (args.repeat > 1 or args.http2) and httpx is None:
+        print("Load mode / --http2 membutuhkan paket 'httpx' (pip install httpx).")
+        sys.exit(1)
+    if args.http2 and importlib.util.find_spec("h2") is None:
+        print("--http2 membutuhkan paket 'h2' (pip install \"httpx[http2]\").")
+        sys.exit(1)
+
+    if args.repeat > 1:
+        asyncio.run(
+            run_load(
+                endpoint,
+                args.card,
+                args.tenant,
+                args.tap_ts,
+                args.repeat,
+                max(1, args.concurrency),
+                http2=args.http2,
+            )
+        )
+        return
+
+    tap_id = args.tap_id or f"{args.card}-{time.time_ns() // 1_000_000}"
     payload = build_payload(args.card, args.tenant, args.tap_ts, tap_id)
     print(f"POST {endpoint} tap_id={tap_id}")
-    print(json.dumps(payload, indent=2))
+    print(dumps_pretty(payload))
+    body = dumps_bytes(payload)
 
+    request_errors = (requests.RequestException,)
+    if httpx is not None:
+        request_errors += (httpx.HTTPError,)
     try:
-        t0 = int(time.time() * 1000)
-        response = requests.post(endpoint, json=payload, timeout=10)
-        t1 = int(time.time() * 1000)
-    except requests.RequestException as exc:
+        t0 = time.perf_counter_ns()
+        if args.http2:
+            with httpx.Client(http2=True, timeout=10) as client:
+                response = client.post(endpoint, content=body, headers=JSON_HEADERS)
+        else:
+            response = SESSION.post(
+                endpoint, data=body, headers=JSON_HEADERS, timeout=10
+            )
+        t1 = time.perf_counter_ns()
+    except request_errors as exc:
         print(f"Request failed: {exc}")
         sys.exit(1)
 
     print(f"\nHTTP {response.status_code} (tap_id={tap_id})")
-    print(f"RTT: {t1 - t0} ms")
+    print(f"RTT: {(t1 - t0) / 1_000_000:.2f} ms")
     try:
-        print(json.dumps(response.json(), indent=2))
+        print(dumps_pretty(loads(response.content)))
     except ValueError:
         print(response.text)
 
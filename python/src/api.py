@@ -1,13 +1,26 @@
 import uvicorn
 import asyncio
+import copy
+import importlib.util
+import logging
 import os
+import sys
 from contextlib import asynccontextmanager
 
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .api_routes import router as api_router
-from . import sse_manager
+from .api_routes import router as api_router, tap_batcher
+from .log_buffer import tap_log
+from .mail_queue import mail_queue
+from .responses import ORJSONResponse
+from . import db_pool, excel_export, sse_manager
+
+logger = logging.getLogger("pgi.api")
+
+# Handler sync (DB + export Excel) dijalankan di threadpool anyio; default 40 thread.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
 
 
 @asynccontextmanager
@@ -18,25 +31,97 @@ async def lifespan(app: FastAPI):
     """
     # Set the main event loop for the SSE manager
     sse_manager.main_event_loop = asyncio.get_running_loop()
+    excel_export.start_pool()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    db_pool.init_pool()
+    await tap_log.start()
+    await tap_batcher.start()
+    await mail_queue.start()
 
     yield
 
-    print("API shutting down.")
+    await mail_queue.stop()
+    await tap_batcher.stop()
+    await tap_log.stop()
+    excel_export.shutdown_pool()
+    db_pool.close_pool()
+
+    logger.info("API shutting down.")
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+class BrowserOnlyCORSMiddleware:
+    """
+    Only runs CORSMiddleware for requests carrying an Origin header.
+    Card readers and other server-to-server clients never send one, so the
+    /tap hot path skips the CORS header inspection entirely.
+    """
+
+    def __init__(self, app, **cors_options):
+        self.app = app
+        self.cors_app = CORSMiddleware(app, **cors_options)
 
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for key, _ in scope["headers"]:
+                if key == b"origin":
+                    await self.cors_app(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
 
-app = FastAPI(lifespan=lifespan)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+if os.getenv("ENABLE_CORS", "1") == "1":
+    app.add_middleware(
+        BrowserOnlyCORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 app.include_router(api_router)
 
+
+def _select_loop() -> str:
+    # uvloop hanya tersedia di POSIX; di Windows tetap memakai asyncio bawaan.
+    if sys.platform != "win32" and importlib.util.find_spec("uvloop"):
+        return "uvloop"
+    return "asyncio"
+
+
+def _select_http() -> str:
+    if importlib.util.find_spec("httptools"):
+        return "httptools"
+    return "h11"
+
+
+def _build_log_config() -> dict:
+    # Logger "pgi.*" memakai handler bawaan uvicorn agar format & output seragam.
+    config = copy.deepcopy(uvicorn.config.LOGGING_CONFIG)
+    config["loggers"]["pgi"] = {
+        "handlers": ["default"],
+        "level": os.getenv("LOG_LEVEL", "INFO").upper(),
+        "propagate": False,
+    }
+    return config
+
+
 if __name__ == "__main__":
     host = os.getenv("API_HOST", "127.0.0.1")
     port = int(os.getenv("API_PORT", "8000"))
-    uvicorn.run("src.api:app", host=host, port=port, reload=True)
+    workers = int(os.getenv("API_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1")
+    reload = os.getenv("API_RELOAD", "0") == "1"
+    # uvicorn tidak mendukung workers > 1 bersamaan dengan reload.
+    # Setiap worker menjalankan lifespan sendiri, jadi sse_manager.main_event_loop
+    # dan koneksi SSE selalu per-worker.
+    uvicorn.run(
+        "src.api:app",
+        host=host,
+        port=port,
+        reload=reload,
+        workers=1 if reload else max(1, workers),
+        loop=_select_loop(),
+        http=_select_http(),
+        log_config=_build_log_config(),
+    )
@@ -1,16 +1,16 @@
 import json
 import math
 import sqlite3
-from typing import List, Optional, Literal, cast, Any
-from collections import defaultdict
-import asyncio
+from typing import List, Optional, Literal, cast, Any, Callable
 import datetime
+import functools
 from datetime import date
-import io
 import calendar
 import os
+import random
+import re
+import threading
 import time
-from uuid import uuid4
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from fastapi import (
@@ -19,22 +19,24 @@ from fastapi import (
     HTTPException,
     status,
     Query,
-    BackgroundTasks,
     Depends,
     Header,
 )
-from fastapi.responses import StreamingResponse, JSONResponse, Response
-from pydantic import BaseModel, Field
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from fastapi.responses import StreamingResponse
+import orjson
+from pydantic import BaseModel, ConfigDict, Field
 
 from . import sse_manager
-from .sqlite_database import get_db_connection
-from .email_service import send_order_confirmation
+from .responses import ORJSONResponse, RawJSONResponse, dumps_json
+from . import db_pool, excel_export
+from .sqlite_database import dict_factory
+from .log_buffer import tap_log
+from .mail_queue import mail_queue
 from .portal_auth import verify_portal_token
 from .quota_utils import evaluate_tenant_quota_for_today
 from .tenant_utils import generate_verification_code
+from .tap_batcher import TapBatcher
+from .ttl_cache import TTLCache
 from update_employee_email import update_employee_email
 from .portal_control import read_override
 
@@ -44,14 +46,197 @@ try:
     JAKARTA_TZ = ZoneInfo("Asia/Jakarta")
 except ZoneInfoNotFoundError:
     JAKARTA_TZ = datetime.timezone(datetime.timedelta(hours=7))
+# Asia/Jakarta tidak punya DST (selalu UTC+7): konversi timestamp per tap memakai
+# offset tetap, lebih murah daripada lookup transisi ZoneInfo.
+_JAKARTA_FIXED_TZ = datetime.timezone(datetime.timedelta(hours=7), "WIB")
 
 CANTEEN_OPEN_HOUR = 8
 CANTEEN_CLOSE_HOUR = 11
+_CANTEEN_OPEN_TIME = datetime.time(CANTEEN_OPEN_HOUR, 0)
+_CANTEEN_CLOSE_TIME = datetime.time(CANTEEN_CLOSE_HOUR, 0)
+_CANTEEN_OPEN_TIME_TEXT = f"{CANTEEN_OPEN_HOUR:02d}:00"
+_CANTEEN_CLOSE_TIME_TEXT = f"{CANTEEN_CLOSE_HOUR:02d}:00"
+_CANTEEN_BEFORE_OPEN_MESSAGE = (
+    f"Akan dibuka pada pukul {_CANTEEN_OPEN_TIME_TEXT} WIB, silakan kembali lagi pada waktu tersebut."
+)
+_CANTEEN_OPEN_MESSAGE = (
+    f"Cawang Canteen buka. Jam layanan pemesanan: {_CANTEEN_OPEN_TIME_TEXT}–{_CANTEEN_CLOSE_TIME_TEXT} WIB."
+)
+
+# Jejak per tahap /tap (t_server_start, t_after_commit, ...) hanya bila TAP_TRACE=1.
+TAP_TRACE = os.getenv("TAP_TRACE", "0") == "1"
 
 DAILY_TRANSACTION_LIMIT_MESSAGE = (
     "Anda sudah melakukan transaksi hari ini (preorder/tap). Hanya 1 transaksi per hari."
 )
 
+WEEKDAY_NAMES = ("Senin", "Selasa", "Rabu", "Kamis", "Jumat", "Sabtu", "Minggu")
+
+# order_code hanya kunci unik/orderHash, bukan token rahasia: cukup PRNG per thread
+# yang di-seed dari os.urandom sekali, tanpa syscall getrandom per pre-order.
+_order_code_rng = threading.local()
+
+
+def _reset_order_code_rng() -> None:
+    # Proses hasil fork (worker uvicorn) tidak boleh mewarisi state PRNG induknya.
+    global _order_code_rng
+    _order_code_rng = threading.local()
+
+
+os.register_at_fork(after_in_child=_reset_order_code_rng)
+
+
+def _format_order_meta(
+    order_datetime: datetime.datetime, transaction_number: int
+) -> tuple[str, str, str]:
+    """
+    Returns (transaction_timestamp, ticket_number, order_datetime_text) dari satu
+    isoformat(): "YYYY-MM-DD HH:MM:SS", "001", "Senin 01/02/2025, 07.30".
+    """
+    iso = order_datetime.isoformat(" ", "seconds")
+    order_datetime_text = "%s %s/%s/%s, %s.%s" % (
+        WEEKDAY_NAMES[order_datetime.weekday()],
+        iso[8:10],
+        iso[5:7],
+        iso[:4],
+        iso[11:13],
+        iso[14:16],
+    )
+    return iso[:19], "%03d" % transaction_number, order_datetime_text
+
+
+def _new_order_code() -> str:
+    rng = getattr(_order_code_rng, "rng", None)
+    if rng is None:
+        rng = _order_code_rng.rng = random.Random(os.urandom(32))
+    return "%032x" % rng.getrandbits(128)
+
+# SQL jalur tulis TAP/preorder sebagai konstanta: teks identik di semua pemanggil
+# sehingga statement cache sqlite3 per koneksi selalu hit.
+# Lookup TAP dalam satu eksekusi: pegawai, tenant (LEFT JOIN agar kartu tidak dikenal
+# dan tenant tidak dikenal tetap bisa dibedakan), dan flag sudah transaksi hari ini.
+_SQL_TAP_LOOKUP = """
+    SELECT e.employee_id,
+           e.card_number,
+           e.name,
+           e.employee_group,
+           e.is_disabled,
+           e.is_blocked,
+           t.id AS t_id,
+           t.name AS t_name,
+           t.quota,
+           EXISTS(
+               SELECT 1
+               FROM transactions
+               WHERE card_number = e.card_number
+                 AND transaction_day = ?
+           ) AS dup
+    FROM employees e
+    LEFT JOIN tenants t ON t.id = ?
+    WHERE e.card_number = ?
+"""
+
+_SQL_CARD_DAY_EXISTS = """
+    SELECT 1
+    FROM transactions
+    WHERE card_number = ?
+      AND transaction_day = ?
+    LIMIT 1
+"""
+
+_SQL_TENANT_DAY_COUNT = """
+    SELECT COUNT(*)
+    FROM transactions
+    WHERE tenant_id = ?
+      AND transaction_day = ?
+"""
+
+# 1 bila masih ada tenant berkuota yang belum penuh hari itu; predikat dievaluasi di SQLite,
+# tidak ada baris per tenant yang dibawa ke Python.
+_SQL_ANY_QUOTA_TENANT_REMAINING = """
+    SELECT EXISTS(
+        SELECT 1
+        FROM tenants t
+        LEFT JOIN (
+            SELECT tenant_id, COUNT(*) AS order_count
+            FROM transactions
+            WHERE transaction_day = ?
+            GROUP BY tenant_id
+        ) tx ON tx.tenant_id = t.id
+        WHERE t.quota IS NOT NULL
+          AND t.quota > 0
+          AND t.quota - COALESCE(tx.order_count, 0) > 0
+    )
+"""
+
+_SQL_INSERT_TRANSACTION = """
+    INSERT INTO transactions (
+        card_number,
+        employee_id,
+        employee_name,
+        employee_group,
+        tenant_id,
+        tenant_name,
+        transaction_date,
+        transaction_day
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Jalur TAP butuh id transaksi baru untuk response; diambil dari statement INSERT yang sama.
+_SQL_INSERT_TRANSACTION_RETURNING_ID = _SQL_INSERT_TRANSACTION.rstrip() + " RETURNING id\n"
+
+_SQL_PREORDER_STATE = """
+    SELECT
+        EXISTS(
+            SELECT 1
+            FROM preorders
+            WHERE employee_id = ?
+              AND order_date = ?
+        ) AS already_ordered,
+        (
+            SELECT COUNT(*)
+            FROM transactions
+            WHERE tenant_id = ?
+              AND transaction_day = ?
+        ) AS tenant_count,
+        EXISTS(
+            SELECT 1
+            FROM tenants t
+            LEFT JOIN (
+                SELECT tenant_id, COUNT(*) AS order_count
+                FROM transactions
+                WHERE transaction_day = ?
+                GROUP BY tenant_id
+            ) tx ON tx.tenant_id = t.id
+            WHERE t.quota IS NOT NULL
+              AND t.quota > 0
+              AND t.quota - COALESCE(tx.order_count, 0) > 0
+        ) AS any_tenant_with_remaining
+"""
+
+# Lookup per index (tanpa scan) yang di-prepare di setiap koneksi pool baru.
+db_pool.register_hot_statements(
+    (_SQL_TAP_LOOKUP, ("", 0, "")),
+    (_SQL_CARD_DAY_EXISTS, ("", "")),
+    (_SQL_TENANT_DAY_COUNT, (0, "")),
+)
+
+_SQL_INSERT_PREORDER = """
+    INSERT INTO preorders (
+        order_code,
+        ticket_number,
+        employee_id,
+        card_number,
+        employee_name,
+        tenant_id,
+        tenant_name,
+        menu_label,
+        order_date,
+        status,
+        queue_number
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'PENDING', ?)
+"""
+
 def ensure_dashboard_admins_table(conn: sqlite3.Connection) -> None:
     cursor = conn.cursor()
     cursor.execute(
@@ -66,6 +251,27 @@ def ensure_dashboard_admins_table(conn: sqlite3.Connection) -> None:
     conn.commit()
 
 
+# Daftar admin dashboard dikelola langsung di DB (tidak ada endpoint-nya), jadi cukup
+# dimuat ulang setelah TTL. CREATE TABLE IF NOT EXISTS hanya dijalankan sekali per proses.
+ADMIN_IDS_CACHE_KEY = "admins"
+_admin_ids_cache = TTLCache(maxsize=1, ttl=float(os.getenv("ADMIN_CACHE_TTL", "30")))
+_admin_table_ready = False
+
+
+def _get_admin_ids() -> frozenset:
+    global _admin_table_ready
+    admin_ids = _admin_ids_cache.get(ADMIN_IDS_CACHE_KEY)
+    if admin_ids is None:
+        with db_pool.get_conn() as conn:
+            if not _admin_table_ready:
+                ensure_dashboard_admins_table(conn)
+                _admin_table_ready = True
+            rows = conn.execute("SELECT employee_id FROM dashboard_admins").fetchall()
+        admin_ids = frozenset(row[0] for row in rows)
+        _admin_ids_cache.set(ADMIN_IDS_CACHE_KEY, admin_ids)
+    return admin_ids
+
+
 def _pick_first_non_empty(*candidates: Optional[str]) -> str:
     for candidate in candidates:
         if candidate is None:
@@ -94,34 +300,24 @@ def check_admin_credentials(emp_id: Optional[str], portal_token: Optional[str])
             "is_admin": False,
         }
 
-    conn = get_db_connection()
-    try:
-        ensure_dashboard_admins_table(conn)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT 1 FROM dashboard_admins WHERE employee_id = ? LIMIT 1",
-            (trimmed_id,),
-        )
-        is_admin = cursor.fetchone() is not None
+    is_admin = trimmed_id in _get_admin_ids()
 
-        verified_user = verify_portal_token(trimmed_id, token_value)
-        token_ok = verified_user is not None
+    verified_user = verify_portal_token(trimmed_id, token_value)
+    token_ok = verified_user is not None
 
-        ok = is_admin and token_ok
-        reason = ""
-        if not is_admin:
-            reason = "emp_id tidak terdaftar sebagai admin."
-        elif not token_ok:
-            reason = "Token tidak cocok atau belum diset."
+    ok = is_admin and token_ok
+    reason = ""
+    if not is_admin:
+        reason = "emp_id tidak terdaftar sebagai admin."
+    elif not token_ok:
+        reason = "Token tidak cocok atau belum diset."
 
-        return {
-            "ok": ok,
-            "reason": reason if not ok else "",
-            "emp_id": trimmed_id,
-            "is_admin": is_admin,
-        }
-    finally:
-        conn.close()
+    return {
+        "ok": ok,
+        "reason": reason if not ok else "",
+        "emp_id": trimmed_id,
+        "is_admin": is_admin,
+    }
 
 
 def require_admin_access(
@@ -150,10 +346,8 @@ def require_admin_access(
     return result
 
 
-def _get_local_day_bounds_from_string(date_text: Optional[str] = None) -> tuple[str, str]:
-    """
-    Returns (start_of_day, end_of_day) strings in local time for the provided date.
-    """
+def _get_local_date_from_string(date_text: Optional[str] = None) -> datetime.date:
+    """Tanggal lokal dari "YYYY-MM-DD" / timestamp ISO; kosong = hari ini."""
     if date_text:
         normalized = date_text.strip()
         if not normalized:
@@ -166,12 +360,34 @@ def _get_local_day_bounds_from_string(date_text: Optional[str] = None) -> tuple[
                 base_date = datetime.datetime.fromisoformat(normalized).date()
     else:
         base_date = datetime.datetime.now().date()
+    return base_date
+
 
-    start_dt = datetime.datetime.combine(base_date, datetime.time.min)
-    end_dt = start_dt + datetime.timedelta(days=1)
+def _get_local_day_from_string(date_text: Optional[str] = None) -> str:
+    """Nilai kolom transaction_day ("YYYY-MM-DD") untuk tanggal yang diberikan."""
+    return _get_local_date_from_string(date_text).isoformat()
+
+
+def _get_local_day_bounds_from_string(date_text: Optional[str] = None) -> tuple[str, str]:
+    """
+    Returns (start_of_day, end_of_day) strings in local time for the provided date.
+    """
+    base_date = _get_local_date_from_string(date_text)
+    # Bound dalam format yang sama dengan transaction_date ("YYYY-MM-DD HH:MM:SS")
+    # supaya dipakai sebagai range langsung pada kolom yang ter-index.
+    end_date = base_date + datetime.timedelta(days=1)
     return (
-        start_dt.strftime("%Y-%m-%d %H:%M:%S"),
-        end_dt.strftime("%Y-%m-%d %H:%M:%S"),
+        f"{base_date.isoformat()} 00:00:00",
+        f"{end_date.isoformat()} 00:00:00",
+    )
+
+
+def _get_month_bounds(year: int, month: int) -> tuple[str, str]:
+    """Returns (awal bulan, awal bulan berikutnya) dalam format transaction_date."""
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return (
+        f"{year:04d}-{month:02d}-01 00:00:00",
+        f"{next_year:04d}-{next_month:02d}-01 00:00:00",
     )
 
 
@@ -182,7 +398,7 @@ def _normalize_timestamp_to_local(
     Normalizes raw timestamp string (or None) into Asia/Jakarta timezone.
     Returns tuple of (aware datetime, transaction_date_text, transaction_day).
     """
-    local_tz = JAKARTA_TZ
+    local_tz = _JAKARTA_FIXED_TZ
     if not raw_ts:
         local_dt = datetime.datetime.now(tz=local_tz)
     else:
@@ -202,21 +418,22 @@ def _normalize_timestamp_to_local(
             if parsed.tzinfo is None:
                 parsed = parsed.replace(tzinfo=local_tz)
             local_dt = parsed.astimezone(local_tz)
-    return (
-        local_dt,
-        local_dt.strftime("%Y-%m-%d %H:%M:%S"),
-        local_dt.date().isoformat(),
-    )
-
-
-def generate_ticket_number(
-    order_datetime: datetime.datetime, sequence_number: int
-) -> str:
-    if sequence_number >= 0:
-        return f"{sequence_number:03d}"
-    return str(sequence_number)
+    # isoformat + slice: format sama dengan strftime("%Y-%m-%d %H:%M:%S"), tanpa parser format.
+    transaction_date_text = local_dt.isoformat(" ", "seconds")[:19]
+    return local_dt, transaction_date_text, transaction_date_text[:10]
+
+
+_TENANT_WHATSAPP = {
+    "yanti": "6285880259653",
+    "rima": "6285718899709",
+}
+# Satu regex alternation untuk semua key (satu pass atas nama tenant, bukan loop per key).
+_TENANT_WHATSAPP_PATTERN = re.compile(
+    "|".join(re.escape(key) for key in _TENANT_WHATSAPP), re.IGNORECASE
+)
 
 
+@functools.lru_cache(maxsize=256)
 def get_tenant_prefix(tenant_name: Optional[str]) -> str:
     name = (tenant_name or "").lower()
     if "yanti" in name:
@@ -226,26 +443,99 @@ def get_tenant_prefix(tenant_name: Optional[str]) -> str:
     return ""
 
 
+@functools.lru_cache(maxsize=256)
 def get_whatsapp_number_for_tenant(tenant_name: str) -> Optional[str]:
-    mapping = {
-        "yanti": "6285880259653",
-        "rima": "6285718899709",
-    }
-    name_lower = tenant_name.lower()
-    for key, number in mapping.items():
-        if key in name_lower:
-            return number
-    return None
+    match = _TENANT_WHATSAPP_PATTERN.search(tenant_name)
+    return _TENANT_WHATSAPP[match.group(0).lower()] if match else None
+
+
+# Data tenant jarang berubah; TAP dan preorder membacanya dari cache per worker.
+# Perubahan lewat endpoint tenant meng-invalidate cache worker tersebut; worker lain
+# melihat perubahan paling lambat setelah TTL.
+_tenant_cache = TTLCache(maxsize=256, ttl=float(os.getenv("TENANT_CACHE_TTL", "30")))
+# Body JSON daftar lengkap tenant + menu untuk GET /tenant (satu entry, TTL sama).
+_tenant_list_cache = TTLCache(maxsize=1, ttl=_tenant_cache.ttl)
+TENANT_LIST_CACHE_KEY = "tenant_list"
+
 
+def _invalidate_tenant_caches(tenant_id: int) -> None:
+    """Dipanggil setelah commit setiap perubahan tenant / tenant_menu."""
+    _tenant_cache.invalidate(tenant_id)
+    _tenant_list_cache.invalidate(TENANT_LIST_CACHE_KEY)
+    _dashboard_cache.invalidate(DASHBOARD_CACHE_KEY)
 
-def is_within_operational_hours(
-    open_hour: int, close_hour: int, now: Optional[datetime.datetime] = None
-) -> bool:
-    now = now or datetime.datetime.now()
-    current_time = now.time()
-    start_time = datetime.time(open_hour, 0)
-    end_time = datetime.time(close_hour, 0)
-    return start_time <= current_time < end_time
+
+# Batas parameter per statement SQLite lama (SQLITE_MAX_VARIABLE_NUMBER = 999).
+_MENU_INSERT_BATCH = 999 // 2
+
+
+def _insert_tenant_menu(cursor, tenant_id: int, items: List[str]) -> None:
+    """INSERT multi-row `VALUES (?, ?), (?, ?), ...` per batch, bukan satu statement per menu."""
+    for start in range(0, len(items), _MENU_INSERT_BATCH):
+        batch = items[start : start + _MENU_INSERT_BATCH]
+        placeholders = ", ".join(["(?, ?)"] * len(batch))
+        params = [value for item in batch for value in (tenant_id, item)]
+        cursor.execute(
+            f"INSERT INTO tenant_menu (tenant_id, menu) VALUES {placeholders}", params
+        )
+
+
+def _sync_tenant_menu(cursor, tenant_id: int, menu: List[str]) -> None:
+    """
+    Menyamakan tenant_menu dengan `menu` (urutan dan duplikat dipertahankan; menu
+    dibaca kembali urut id). Row lama yang urutannya sudah cocok dengan awal `menu`
+    dipertahankan, sisanya dihapus per id dan item berikutnya di-INSERT di belakang.
+    Menu yang tidak berubah tidak ditulis sama sekali; bila item pertama sudah
+    berbeda, hasilnya sama dengan DELETE + INSERT semua.
+    """
+    cursor.execute(
+        "SELECT id, menu FROM tenant_menu WHERE tenant_id = ? ORDER BY id", (tenant_id,)
+    )
+    current = cursor.fetchall()
+    if [row["menu"] for row in current] == menu:
+        return
+
+    # Cocokkan awal `menu` sebagai subsequence dari menu lama (greedy, urut id).
+    kept_ids = set()
+    matched = 0
+    for row in current:
+        if matched < len(menu) and row["menu"] == menu[matched]:
+            kept_ids.add(row["id"])
+            matched += 1
+
+    removed = [(row["id"],) for row in current if row["id"] not in kept_ids]
+    if removed:
+        cursor.executemany("DELETE FROM tenant_menu WHERE id = ?", removed)
+    if matched < len(menu):
+        _insert_tenant_menu(cursor, tenant_id, menu[matched:])
+
+
+def _get_tenant_cached(cursor, tenant_id: int) -> Optional[dict[str, Any]]:
+    """Returns tenant id/name/quota/is_limited/verification_code (read-only dict)."""
+    tenant = _tenant_cache.get(tenant_id)
+    if tenant is None:
+        cursor.execute(
+            "SELECT id, name, quota, is_limited, verification_code FROM tenants WHERE id = ?",
+            (tenant_id,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        tenant = dict(row)
+        _tenant_cache.set(tenant_id, tenant)
+    return tenant
+
+
+# /dashboard/overview di-poll semua layar monitor dengan jawaban yang sama; payload
+# disimpan sebentar dan di-invalidate setiap ada pre-order baru.
+DASHBOARD_CACHE_KEY = "overview"
+_dashboard_cache = TTLCache(maxsize=1, ttl=float(os.getenv("DASHBOARD_CACHE_TTL", "2")))
+
+# Total baris /transaction/report sama untuk semua halaman dengan filter yang sama;
+# key = (where_sql, params). Dikosongkan setiap ada transaksi baru/diubah/dihapus.
+_report_count_cache = TTLCache(
+    maxsize=128, ttl=float(os.getenv("REPORT_COUNT_CACHE_TTL", "30"))
+)
 
 
 def _normalize_canteen_mode(raw_value: Optional[str]) -> Literal["OPEN", "CLOSE", "NORMAL"]:
@@ -256,7 +546,7 @@ def _normalize_canteen_mode(raw_value: Optional[str]) -> Literal["OPEN", "CLOSE"
 
 
 def _get_or_create_canteen_status_row() -> dict[str, Any]:
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     try:
         cursor = conn.cursor()
         cursor.execute("SELECT mode, updated_at, updated_by FROM canteen_status WHERE id = 1")
@@ -273,7 +563,7 @@ def _get_or_create_canteen_status_row() -> dict[str, Any]:
             row = cursor.fetchone()
         return dict(row)
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 def get_canteen_mode() -> Literal["OPEN", "CLOSE", "NORMAL"]:
@@ -281,7 +571,15 @@ def get_canteen_mode() -> Literal["OPEN", "CLOSE", "NORMAL"]:
     return _normalize_canteen_mode(row.get("mode"))
 
 
-def get_effective_canteen_mode() -> Literal["OPEN", "CLOSE", "NORMAL"]:
+# Mode efektif dibaca setiap /tap dan /canteen/status, tapi jarang berubah. Perubahan
+# lewat API langsung meng-invalidate; override file (manage_portal) terlihat setelah TTL.
+CANTEEN_MODE_CACHE_KEY = "mode"
+_canteen_mode_cache = TTLCache(
+    maxsize=1, ttl=float(os.getenv("CANTEEN_MODE_CACHE_TTL", "2"))
+)
+
+
+def _read_effective_canteen_mode() -> Literal["OPEN", "CLOSE", "NORMAL"]:
     override = read_override()
     if override == "open":
         return "OPEN"
@@ -290,8 +588,16 @@ def get_effective_canteen_mode() -> Literal["OPEN", "CLOSE", "NORMAL"]:
     return get_canteen_mode()
 
 
+def get_effective_canteen_mode() -> Literal["OPEN", "CLOSE", "NORMAL"]:
+    mode = _canteen_mode_cache.get(CANTEEN_MODE_CACHE_KEY)
+    if mode is None:
+        mode = _read_effective_canteen_mode()
+        _canteen_mode_cache.set(CANTEEN_MODE_CACHE_KEY, mode)
+    return mode
+
+
 def update_canteen_mode(new_mode: Literal["OPEN", "CLOSE", "NORMAL"], updated_by: Optional[str] = None) -> None:
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     try:
         cursor = conn.cursor()
         cursor.execute(
@@ -306,91 +612,71 @@ def update_canteen_mode(new_mode: Literal["OPEN", "CLOSE", "NORMAL"], updated_by
             (new_mode, updated_by),
         )
         conn.commit()
+        _canteen_mode_cache.invalidate(CANTEEN_MODE_CACHE_KEY)
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
-def canteen_is_open(now: Optional[datetime.datetime] = None) -> bool:
-    now = now or datetime.datetime.now()
+def canteen_is_open(now: datetime.datetime) -> bool:
+    """`now` wajib: pemanggil membaca jam sekali per request lalu meneruskannya."""
     mode = get_effective_canteen_mode()
     if mode == "OPEN":
         return True
     if mode == "CLOSE":
         return False
-    return is_within_operational_hours(CANTEEN_OPEN_HOUR, CANTEEN_CLOSE_HOUR, now)
+    return _CANTEEN_OPEN_TIME <= now.time() < _CANTEEN_CLOSE_TIME
+
+
+_CANTEEN_STATUS_BY_REASON = {
+    "forced_open": (True, "Portal dibuka manual melalui panel admin."),
+    "forced_closed": (False, "Portal ditutup manual melalui panel admin."),
+    "before_open": (False, _CANTEEN_BEFORE_OPEN_MESSAGE),
+    "after_close": (False, "Silakan pesan makan langsung di kantin (on the spot)."),
+    "open": (True, _CANTEEN_OPEN_MESSAGE),
+}
+
+
+@functools.lru_cache(maxsize=16)
+def _canteen_status_payload(mode: str, reason: str) -> dict:
+    # Hanya ada beberapa kombinasi (mode, reason); payload dibangun sekali lalu dipakai ulang.
+    is_open, message = _CANTEEN_STATUS_BY_REASON[reason]
+    return {
+        "is_open": is_open,
+        "reason": reason,
+        "message": message,
+        "open_time": _CANTEEN_OPEN_TIME_TEXT,
+        "close_time": _CANTEEN_CLOSE_TIME_TEXT,
+        "mode": mode,
+    }
 
 
 def get_canteen_status(now: datetime.datetime) -> dict:
     """
     Determine whether the canteen is open or closed.
     Allows manual override via portal_control file.
+    The returned dict is shared between calls and must not be modified.
     """
     mode = get_effective_canteen_mode()
-    open_time_text = f"{CANTEEN_OPEN_HOUR:02d}:00"
-    close_time_text = f"{CANTEEN_CLOSE_HOUR:02d}:00"
-
-    status_payload = {
-        "is_open": False,
-        "reason": "",
-        "message": "",
-        "open_time": open_time_text,
-        "close_time": close_time_text,
-        "mode": mode,
-    }
 
     if mode == "OPEN":
-        status_payload.update(
-            {
-                "is_open": True,
-                "reason": "forced_open",
-                "message": "Portal dibuka manual melalui panel admin.",
-            }
-        )
-        return status_payload
-    if mode == "CLOSE":
-        status_payload.update(
-            {
-                "is_open": False,
-                "reason": "forced_closed",
-                "message": "Portal ditutup manual melalui panel admin.",
-            }
-        )
-        return status_payload
-
-    if now.time() < datetime.time(CANTEEN_OPEN_HOUR, 0):
-        status_payload["reason"] = "before_open"
-        status_payload["message"] = (
-            f"Akan dibuka pada pukul {open_time_text} WIB, silakan kembali lagi pada waktu tersebut."
-        )
-    elif now.time() >= datetime.time(CANTEEN_CLOSE_HOUR, 0):
-        status_payload["reason"] = "after_close"
-        status_payload["message"] = (
-            "Silakan pesan makan langsung di kantin (on the spot)."
-        )
+        reason = "forced_open"
+    elif mode == "CLOSE":
+        reason = "forced_closed"
     else:
-        status_payload["is_open"] = True
-        status_payload["reason"] = "open"
-        status_payload["message"] = (
-            f"Cawang Canteen buka. Jam layanan pemesanan: {open_time_text}–{close_time_text} WIB."
-        )
-
-    status_payload["is_open"] = canteen_is_open(now)
-    return status_payload
+        current_time = now.time()
+        if current_time < _CANTEEN_OPEN_TIME:
+            reason = "before_open"
+        elif current_time >= _CANTEEN_CLOSE_TIME:
+            reason = "after_close"
+        else:
+            reason = "open"
+    return _canteen_status_payload(mode, reason)
 
 
 def _card_has_transaction_for_day(cursor, card_number: str, transaction_day: str) -> bool:
     if not card_number or not transaction_day:
         return False
-    cursor.execute(
-        """
-        SELECT 1
-        FROM transactions
-        WHERE card_number = ?
-          AND transaction_day = ?
-        LIMIT 1
-        """,
-        (card_number, transaction_day),
-    )
+    cursor.execute(_SQL_CARD_DAY_EXISTS, (card_number, transaction_day))
     return cursor.fetchone() is not None
 
 
@@ -401,8 +687,7 @@ class EmployeeCreateRequest(BaseModel):
     employee_group: str = Field(min_length=1, alias="employeeGroup")
     is_disabled: Optional[bool] = Field(False, alias="isDisabled")
 
-    class Config:
-        validate_by_name = True
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class EmployeeUpdateRequest(BaseModel):
@@ -411,8 +696,7 @@ class EmployeeUpdateRequest(BaseModel):
     employee_group: Optional[str] = Field(None, alias="employeeGroup")
     is_disabled: Optional[bool] = Field(None, alias="isDisabled")
 
-    class Config:
-        validate_by_name = True
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class TenantUpdateRequest(BaseModel):
@@ -421,8 +705,7 @@ class TenantUpdateRequest(BaseModel):
     menu: List[str]
     is_limited: bool = Field(alias="isLimited")
 
-    class Config:
-        validate_by_name = True
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class TenantCreateRequest(BaseModel):
@@ -431,22 +714,19 @@ class TenantCreateRequest(BaseModel):
     menu: List[str]
     is_limited: bool = Field(alias="isLimited")
 
-    class Config:
-        validate_by_name = True
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class DeviceCreateRequest(BaseModel):
     device_code: str = Field(min_length=1, alias="deviceCode")
 
-    class Config:
-        validate_by_name = True
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class DeviceUpdateRequest(BaseModel):
     tenant_id: Optional[int] = Field(None, alias="tenantId")
 
-    class Config:
-        validate_by_name = True
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class TransactionCreateRequest(BaseModel):
@@ -454,8 +734,7 @@ class TransactionCreateRequest(BaseModel):
     tenant_id: int = Field(alias="tenantId")
     transaction_date: str = Field(min_length=1, alias="transactionDate")
 
-    class Config:
-        validate_by_name = True
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class TransactionUpdateRequest(BaseModel):
@@ -463,8 +742,53 @@ class TransactionUpdateRequest(BaseModel):
     tenant_id: Optional[int] = Field(None, alias="tenantId")
     transaction_date: Optional[str] = Field(None, alias="transactionDate")
 
-    class Config:
-        validate_by_name = True
+    model_config = ConfigDict(validate_by_name=True)
+
+
+# Kolom yang di-update per field request (bit 1: employeeId, 2: tenantId, 4: transactionDate).
+_UPDATE_TRANSACTION_GROUPS = (
+    ("employee_id", "card_number", "employee_name", "employee_group"),
+    ("tenant_id", "tenant_name"),
+    ("transaction_date", "transaction_day"),
+)
+
+
+def _build_update_transaction_sql() -> dict[int, tuple[str, tuple[str, ...]]]:
+    """Precompute UPDATE statement + urutan kolom untuk tiap kombinasi field."""
+    table = {}
+    for mask in range(1, 1 << len(_UPDATE_TRANSACTION_GROUPS)):
+        columns = tuple(
+            column
+            for bit, group in enumerate(_UPDATE_TRANSACTION_GROUPS)
+            if mask & (1 << bit)
+            for column in group
+        )
+        set_clause = ", ".join(f"{column} = ?" for column in columns)
+        table[mask] = (f"UPDATE transactions SET {set_clause} WHERE id = ?", columns)
+    return table
+
+
+UPDATE_TRANSACTION_SQL = _build_update_transaction_sql()
+
+
+def _build_update_employee_sql() -> dict[frozenset, tuple[str, tuple[str, ...]]]:
+    """
+    Precompute UPDATE employees untuk tiap subset field EmployeeUpdateRequest, supaya
+    teks SQL selalu sama (hit di statement cache koneksi) dan tidak dirakit per request.
+    """
+    fields = tuple(EmployeeUpdateRequest.model_fields)
+    table = {}
+    for mask in range(1, 1 << len(fields)):
+        columns = tuple(field for bit, field in enumerate(fields) if mask & (1 << bit))
+        set_clause = ", ".join(f"{column} = ?" for column in columns)
+        table[frozenset(columns)] = (
+            f"UPDATE employees SET {set_clause} WHERE employee_id = ?",
+            columns,
+        )
+    return table
+
+
+UPDATE_EMPLOYEE_SQL = _build_update_employee_sql()
 
 
 TapStatusLiteral = Literal["accepted", "rejected"]
@@ -486,8 +810,7 @@ class TapTransactionRequest(BaseModel):
     tap_ts: Optional[str] = Field(default=None, alias="tap_ts")
     tap_id: Optional[str] = Field(default=None, alias="tap_id")
 
-    class Config:
-        validate_by_name = True
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class TapTransactionSummary(BaseModel):
@@ -515,41 +838,19 @@ class CanteenStatusUpdateRequest(BaseModel):
     mode: Literal["OPEN", "CLOSE", "NORMAL"]
 
 
-
-def _build_tap_response(
-    status_value: TapStatusLiteral,
-    reason_value: TapReasonLiteral,
-    *,
-    ticket_number: Optional[str] = None,
-    summary: Optional[TapTransactionSummary] = None,
-    tap_id: Optional[str] = None,
-    server_commit_ts: Optional[int] = None,
-) -> TapTransactionResponse:
-    return TapTransactionResponse(
-        status=status_value,
-        reason=reason_value,
-        ticket_number=ticket_number,
-        transaction=summary,
-        tap_id=tap_id,
-        server_commit_ts=server_commit_ts,
-    )
-
-
 class PreorderCreateRequest(BaseModel):
     employee_id: str = Field(min_length=1, alias="employeeId")
     tenant_id: int = Field(alias="tenantId")
     menu_label: str = Field(min_length=1, alias="menuLabel")
 
-    class Config:
-        validate_by_name = True
+    model_config = ConfigDict(validate_by_name=True)
 
 
 class PortalLoginRequest(BaseModel):
     employee_id: str = Field(min_length=1, alias="employeeId")
     portal_token: str = Field(min_length=1, alias="portalToken")
 
-    class Config:
-        validate_by_name = True
+    model_config = ConfigDict(validate_by_name=True)
 
 
 @router.post("/auth/portal-login")
@@ -571,11 +872,23 @@ def portal_login(request: PortalLoginRequest):
     }
 
 
+@router.get("/pool-health", status_code=status.HTTP_200_OK)
+def pool_health():
+    """
+    Status pool koneksi SQLite per mode (in_use / idle) dan jumlah client /sse yang
+    terhubung ke worker ini, untuk monitoring.
+    """
+    return {
+        "pools": db_pool.pool_stats(),
+        "sse_subscribers": sse_manager.subscriber_count,
+    }
+
+
 @router.get("/canteen/status", status_code=status.HTTP_200_OK)
 def canteen_status():
     now = datetime.datetime.now()
     status_payload = get_canteen_status(now)
-    return JSONResponse(content=status_payload)
+    return ORJSONResponse(content=status_payload)
 
 
 @router.get("/admin/canteen-status", status_code=status.HTTP_200_OK)
@@ -584,7 +897,7 @@ def admin_get_canteen_status(_: dict[str, Any] = Depends(require_admin_access)):
     mode = _normalize_canteen_mode(row.get("mode"))
     return {
         "mode": mode,
-        "is_open": canteen_is_open(),
+        "is_open": canteen_is_open(datetime.datetime.now()),
         "updated_at": row.get("updated_at"),
         "updated_by": row.get("updated_by"),
     }
@@ -620,7 +933,7 @@ def admin_check(
     result = check_admin_credentials(resolved_emp_id, resolved_token)
     if result["ok"]:
         return result
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_401_UNAUTHORIZED,
         content=result,
     )
@@ -628,10 +941,10 @@ def admin_check(
 
 @router.get("/tenant/{tenant_id}/quota-state", status_code=status.HTTP_200_OK)
 def get_tenant_quota_state(tenant_id: int):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     try:
         quota_state = evaluate_tenant_quota_for_today(conn, tenant_id)
-        return JSONResponse(content=quota_state)
+        return ORJSONResponse(content=quota_state)
     except ValueError as exc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -645,14 +958,131 @@ def get_tenant_quota_state(tenant_id: int):
             detail=f"Gagal menghitung kuota tenant: {exc}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
-@router.post("/tap", response_model=TapTransactionResponse, status_code=status.HTTP_200_OK)
-def tap_transaction(tap_request: TapTransactionRequest):
+def _apply_tap_write(cursor, job: dict[str, Any]) -> dict[str, Any]:
+    """
+    Cek kuota lalu INSERT satu tap. Dipanggil di dalam transaksi tulis.
+    Duplikat harian tidak di-SELECT lagi di sini: lookup TAP sudah menyaring kartu yang
+    sudah transaksi, dan tap dobel yang lolos ditolak unique index
+    idx_transactions_card_day (IntegrityError -> duplicate_daily).
+    """
+    transaction_day = job["transaction_day"]
+
+    quota_value = job["quota"] or 0
+    cursor.execute(_SQL_TENANT_DAY_COUNT, (job["tenant_id"], transaction_day))
+    tenant_orders_today = cursor.fetchone()[0]
+    remaining_slots = quota_value - tenant_orders_today
+    allow_due_to_free_mode = False
+    if quota_value == 0:
+        quota_reason = "unlimited"
+    elif remaining_slots > 0:
+        quota_reason = "ok"
+    else:
+        cursor.execute(_SQL_ANY_QUOTA_TENANT_REMAINING, (transaction_day,))
+        any_tenant_with_remaining = bool(cursor.fetchone()[0])
+        if any_tenant_with_remaining:
+            quota_reason = "quota_exceeded"
+        else:
+            quota_reason = "free_mode"
+            allow_due_to_free_mode = True
+    tap_log.write(
+        f"[tap_quota] tenant_id={job['tenant_id']} quota={quota_value} count_today={tenant_orders_today} remaining={remaining_slots} reason={quota_reason}"
+    )
+    if quota_value > 0 and remaining_slots <= 0 and not allow_due_to_free_mode:
+        return {"reason": "quota_exceeded", "transaction_id": None}
+
+    cursor.execute(
+        _SQL_INSERT_TRANSACTION_RETURNING_ID,
+        (
+            job["card_number"],
+            job["employee_id"],
+            job["employee_name"],
+            job["employee_group"],
+            job["tenant_id"],
+            job["tenant_name"],
+            job["transaction_date"],
+            transaction_day,
+        ),
+    )
+    return {"reason": "ok", "transaction_id": cursor.fetchone()[0]}
+
+
+def _commit_tap_batch(jobs: List[dict[str, Any]]) -> List[Any]:
+    """
+    Menulis sekumpulan tap dalam satu BEGIN IMMEDIATE ... COMMIT.
+    Tiap tap dibungkus SAVEPOINT agar IntegrityError satu tap tidak membatalkan tap lain.
+    """
+    conn = db_pool.checkout(mode="tap")
+    cursor = conn.cursor()
+    results: List[Any] = []
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        for job in jobs:
+            cursor.execute("SAVEPOINT tap_job")
+            try:
+                results.append(_apply_tap_write(cursor, job))
+            except sqlite3.IntegrityError as exc:
+                cursor.execute("ROLLBACK TO tap_job")
+                results.append(exc)
+            cursor.execute("RELEASE tap_job")
+        conn.commit()
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        db_pool.release(conn)
+
+    server_commit_ts = int(time.time() * 1000)
+    for result in results:
+        if isinstance(result, dict):
+            result["server_commit_ts"] = server_commit_ts
+    return results
+
+
+tap_batcher = TapBatcher(
+    _commit_tap_batch,
+    max_batch=int(os.getenv("TAP_BATCH_MAX", "32")),
+    max_wait_ms=float(os.getenv("TAP_BATCH_WAIT_MS", "5")),
+)
+
+
+def _lookup_tap(transaction_day: str, tenant_id: int, card_number: str):
+    conn = db_pool.checkout(mode="tap")
+    try:
+        # Tuple biasa (bukan sqlite3.Row): pemanggil meng-unpack posisi kolom.
+        # row_factory dikembalikan ke sqlite3.Row oleh pool saat release.
+        conn.row_factory = None
+        return conn.execute(
+            _SQL_TAP_LOOKUP, (transaction_day, tenant_id, card_number)
+        ).fetchone()
+    finally:
+        db_pool.release(conn)
+
+
+async def _write_tap(job: dict[str, Any]) -> dict[str, Any]:
+    if tap_batcher.running:
+        return await tap_batcher.run(job)
+    result = (await db_pool.run(_commit_tap_batch, [job]))[0]
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+@router.post(
+    "/tap",
+    status_code=status.HTTP_200_OK,
+    responses={status.HTTP_200_OK: {"model": TapTransactionResponse}},
+)
+async def tap_transaction(tap_request: TapTransactionRequest):
     """
     Single-shot endpoint khusus device TAP.
-    Melakukan lookup kartu, cek tenant serta kuota, dan menulis transaksi dalam satu transaksi DB.
+    Lookup kartu dan tenant dijalankan di executor DB lewat pool mode="tap" (koneksi
+    baca-tulis dengan lock timeout pendek, bukan pool read-only); tap yang lolos
+    diantrikan langsung ke tap_batcher di event loop, yang menggabungkan tap berdekatan
+    dalam satu transaksi DB. Thread handler tidak ikut menunggu giliran write lock.
     """
     start_time = time.perf_counter()
     tap_id_value = (
@@ -663,196 +1093,87 @@ def tap_transaction(tap_request: TapTransactionRequest):
 
     def _log_tap(status_value: TapStatusLiteral, reason_value: TapReasonLiteral):
         duration_ms = (time.perf_counter() - start_time) * 1000
-        print(
+        tap_log.write(
             f"[tap_transaction] tap_id={tap_id_value} status={status_value} reason={reason_value} duration={duration_ms:.2f}ms"
         )
 
-    def _trace_stage(stage: str) -> int:
-        timestamp_ms = int(time.time() * 1000)
-        print(f"[tap_trace] tap_id={tap_id_value} stage={stage} ts={timestamp_ms}")
-        return timestamp_ms
+    def _trace_stage(stage: str) -> None:
+        if TAP_TRACE:
+            timestamp_ms = int(time.time() * 1000)
+            tap_log.write(f"[tap_trace] tap_id={tap_id_value} stage={stage} ts={timestamp_ms}")
 
     def _tap_response(
         status_value: TapStatusLiteral,
         reason_value: TapReasonLiteral,
         *,
-        summary: Optional[TapTransactionSummary] = None,
-    ) -> TapTransactionResponse:
-        response = _build_tap_response(
-            status_value=status_value,
-            reason_value=reason_value,
-            summary=summary,
-            tap_id=tap_id_value,
-            server_commit_ts=server_commit_ts,
-        )
+        summary: Optional[dict[str, Any]] = None,
+        status_code: int = status.HTTP_200_OK,
+    ) -> ORJSONResponse:
         _log_tap(status_value, reason_value)
-        return response
+        # Dict literal berbentuk TapTransactionResponse (model hanya untuk dokumentasi
+        # OpenAPI), dikembalikan langsung sebagai Response: tanpa konstruksi pydantic,
+        # jsonable_encoder, maupun validasi response_model.
+        return ORJSONResponse(
+            content={
+                "status": status_value,
+                "reason": reason_value,
+                "tap_id": tap_id_value,
+                "server_commit_ts": server_commit_ts,
+                "ticket_number": None,
+                "transaction": summary,
+            },
+            status_code=status_code,
+        )
 
     _trace_stage("t_server_start")
 
     _, transaction_date_text, transaction_day = _normalize_timestamp_to_local(
         tap_request.tap_ts, field_name="tap_ts"
     )
-    conn = get_db_connection(mode="tap")
-    cursor = conn.cursor()
-    summary: Optional[TapTransactionSummary] = None
-    employee_row = None
-    tenant_row = None
+    row = await db_pool.run(
+        _lookup_tap, transaction_day, tap_request.tenant_id, tap_request.card_number
+    )
 
-    def _rollback_if_needed():
-        if conn.in_transaction:
-            conn.rollback()
+    if not row:
+        return _tap_response(status_value="rejected", reason_value="unknown_card")
+    # Urutan kolom mengikuti _SQL_TAP_LOOKUP; unpack posisi, bukan lookup per nama kolom.
+    (
+        employee_id,
+        card_number,
+        employee_name,
+        employee_group,
+        is_disabled,
+        is_blocked,
+        tenant_id,
+        tenant_name,
+        tenant_quota,
+        has_transaction_today,
+    ) = row
+    if is_disabled or is_blocked:
+        return _tap_response(status_value="rejected", reason_value="unknown_card")
+    if tenant_id is None:
+        return _tap_response(status_value="rejected", reason_value="unknown_tenant")
+    if has_transaction_today:
+        # Tap dobel yang lolos cek ini (race antar request) ditolak unique index
+        # idx_transactions_card_day saat INSERT: IntegrityError -> duplicate_daily.
+        return _tap_response(status_value="rejected", reason_value="duplicate_daily")
+
+    job = {
+        "card_number": card_number,
+        "employee_id": employee_id,
+        "employee_name": employee_name,
+        "employee_group": employee_group,
+        "tenant_id": tenant_id,
+        "tenant_name": tenant_name,
+        "quota": tenant_quota,
+        "transaction_date": transaction_date_text,
+        "transaction_day": transaction_day,
+    }
 
     try:
-        cursor.execute(
-            """
-            SELECT employee_id,
-                   card_number,
-                   name,
-                   employee_group,
-                   is_disabled,
-                   is_blocked
-            FROM employees
-            WHERE card_number = ?
-            """,
-            (tap_request.card_number,),
-        )
-        employee = cursor.fetchone()
-        if (
-            not employee
-            or employee["is_disabled"]
-            or employee["is_blocked"]
-        ):
-            return _tap_response(
-                status_value="rejected", reason_value="unknown_card"
-            )
-        employee_row = employee
-
-        cursor.execute(
-            """
-            SELECT id, name, quota, is_limited
-            FROM tenants
-            WHERE id = ?
-            """,
-            (tap_request.tenant_id,),
-        )
-        tenant = cursor.fetchone()
-        if not tenant:
-            return _tap_response(
-                status_value="rejected", reason_value="unknown_tenant"
-            )
-        tenant_row = tenant
-        quota_value = tenant["quota"] or 0
-
-        _trace_stage("t_before_begin_immediate")
-        cursor.execute("BEGIN IMMEDIATE")
-        _trace_stage("t_after_begin_immediate")
-
-        if _card_has_transaction_for_day(
-            cursor, employee["card_number"], transaction_day
-        ):
-            _rollback_if_needed()
-            return _tap_response(
-                status_value="rejected", reason_value="duplicate_daily"
-            )
-
-        cursor.execute(
-            """
-            SELECT COUNT(*)
-            FROM transactions
-            WHERE tenant_id = ?
-              AND transaction_day = ?
-            """,
-            (tenant["id"], transaction_day),
-        )
-        tenant_orders_today = cursor.fetchone()[0]
-        remaining_slots = quota_value - tenant_orders_today
-        allow_due_to_free_mode = False
-        if quota_value == 0:
-            quota_reason = "unlimited"
-        elif remaining_slots > 0:
-            quota_reason = "ok"
-        else:
-            cursor.execute(
-                """
-                SELECT t.id,
-                       t.quota,
-                       COALESCE(tx.order_count, 0) AS order_count
-                FROM tenants t
-                LEFT JOIN (
-                    SELECT tenant_id, COUNT(*) AS order_count
-                    FROM transactions
-                    WHERE transaction_day = ?
-                    GROUP BY tenant_id
-                ) tx ON tx.tenant_id = t.id
-                WHERE t.quota IS NOT NULL AND t.quota > 0
-                """,
-                (transaction_day,),
-            )
-            tenants_with_quota = cursor.fetchall()
-            any_tenant_with_remaining = False
-            for tenant_info in tenants_with_quota:
-                tenant_quota = tenant_info["quota"] or 0
-                tenant_taken = tenant_info["order_count"] or 0
-                if tenant_quota - tenant_taken > 0:
-                    any_tenant_with_remaining = True
-                    break
-            if any_tenant_with_remaining:
-                quota_reason = "quota_exceeded"
-            else:
-                quota_reason = "free_mode"
-                allow_due_to_free_mode = True
-        print(
-            f"[tap_quota] tenant_id={tenant['id']} quota={quota_value} count_today={tenant_orders_today} remaining={remaining_slots} reason={quota_reason}"
-        )
-        if quota_value > 0 and remaining_slots <= 0 and not allow_due_to_free_mode:
-            _rollback_if_needed()
-            return _tap_response(
-                status_value="rejected", reason_value="quota_exceeded"
-            )
-
-        _trace_stage("t_before_insert")
-        cursor.execute(
-            """
-            INSERT INTO transactions (
-                card_number,
-                employee_id,
-                employee_name,
-                employee_group,
-                tenant_id,
-                tenant_name,
-                transaction_date,
-                transaction_day
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                employee["card_number"],
-                employee["employee_id"],
-                employee["name"],
-                employee["employee_group"],
-                tenant["id"],
-                tenant["name"],
-                transaction_date_text,
-                transaction_day,
-            ),
-        )
-        transaction_id = cursor.lastrowid
-        conn.commit()
-        server_commit_ts = _trace_stage("t_after_commit")
-
-        summary = TapTransactionSummary(
-            transaction_id=transaction_id,
-            card_number=employee_row["card_number"],
-            employee_id=employee_row["employee_id"],
-            employee_name=employee_row["name"],
-            employee_group=employee_row["employee_group"],
-            tenant_id=tenant_row["id"],
-            tenant_name=tenant_row["name"],
-            transaction_date=transaction_date_text,
-            transaction_day=transaction_day,
-        )
+        _trace_stage("t_before_write")
+        result = await _write_tap(job)
     except sqlite3.IntegrityError as exc:
-        _rollback_if_needed()
         error_text = str(exc).lower()
         if "unique" in error_text or "transaction_day" in error_text:
             return _tap_response(
@@ -863,72 +1184,59 @@ def tap_transaction(tap_request: TapTransactionRequest):
             detail=f"Gagal membuat transaksi TAP: {exc}",
         )
     except sqlite3.OperationalError as exc:
-        _rollback_if_needed()
         message = str(exc).lower()
         if "database is locked" in message:
-            resp = _tap_response(status_value="rejected", reason_value="db_busy")
-            return JSONResponse(
+            return _tap_response(
+                status_value="rejected",
+                reason_value="db_busy",
                 status_code=status.HTTP_409_CONFLICT,
-                content=resp.dict(),
             )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error saat TAP: {exc}",
         )
-    except sqlite3.IntegrityError as exc:
-        _rollback_if_needed()
-        error_text = str(exc).lower()
-        if (
-            "transaction_day" in error_text
-            or "idx_transactions_card_day" in error_text
-            or "unique" in error_text
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=DAILY_TRANSACTION_LIMIT_MESSAGE,
-            )
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Gagal membuat pre-order: {exc}",
-        )
     except HTTPException:
-        _rollback_if_needed()
         raise
     except Exception as exc:
-        _rollback_if_needed()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"TAP endpoint gagal: {exc}",
         )
-    finally:
-        conn.close()
 
-    if not summary or not employee_row or not tenant_row:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="TAP berhasil tetapi ringkasan tidak terbentuk.",
-        )
+    if result["reason"] != "ok":
+        return _tap_response(status_value="rejected", reason_value=result["reason"])
+
+    server_commit_ts = result["server_commit_ts"]
+    _trace_stage("t_after_commit")
 
+    summary = {
+        "transaction_id": result["transaction_id"],
+        "card_number": card_number,
+        "employee_id": employee_id,
+        "employee_name": employee_name,
+        "employee_group": employee_group,
+        "tenant_id": tenant_id,
+        "tenant_name": tenant_name,
+        "transaction_date": transaction_date_text,
+        "transaction_day": transaction_day,
+    }
     response_payload = _tap_response(
         status_value="accepted",
         reason_value="ok",
         summary=summary,
     )
 
-    _trace_stage("t_before_sse_trigger")
+    _report_count_cache.clear()
     if sse_manager.main_event_loop:
         sse_payload = {
-            "id": str(tenant_row["id"]),
-            "name": employee_row["name"],
-            "employee_id": employee_row["employee_id"],
+            "id": str(tenant_id),
+            "name": employee_name,
+            "employee_id": employee_id,
             "tap_id": tap_id_value,
             "server_commit_ts": server_commit_ts,
         }
-        asyncio.run_coroutine_threadsafe(
-            sse_manager.trigger_sse_event_async(sse_payload),
-            sse_manager.main_event_loop,
-        )
-    _trace_stage("t_after_sse_trigger")
+        # Handler sudah berjalan di event loop: enqueue hanya append ke ring buffer SSE.
+        sse_manager.enqueue(sse_payload)
 
     return response_payload
 
@@ -938,7 +1246,7 @@ def create_transaction(
     transaction_data: TransactionCreateRequest,
     _: dict[str, Any] = Depends(require_admin_access),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     start_time = time.perf_counter()
     success = False
@@ -946,33 +1254,6 @@ def create_transaction(
         f"[create_transaction] start tenant_id={transaction_data.tenant_id} employee_id={transaction_data.employee_id}"
     )
     try:
-
-        cursor.execute(
-            "SELECT card_number, name, employee_group FROM employees WHERE employee_id = ?",
-            (transaction_data.employee_id,),
-        )
-        employee = cursor.fetchone()
-        if not employee:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Employee with ID '{transaction_data.employee_id}' not found",
-            )
-
-        cursor.execute(
-            "SELECT name FROM tenants WHERE id = ?", (transaction_data.tenant_id,)
-        )
-        tenant = cursor.fetchone()
-        if not tenant:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Tenant with ID '{transaction_data.tenant_id}' not found",
-            )
-
-        employee_card_number = employee["card_number"]
-        employee_name = employee["name"]
-        employee_group = employee["employee_group"]
-        tenant_name = tenant["name"]
-
         (
             _,
             normalized_transaction_date,
@@ -981,12 +1262,8 @@ def create_transaction(
             transaction_data.transaction_date, field_name="transactionDate"
         )
 
-        if _card_has_transaction_for_day(cursor, employee_card_number, transaction_day):
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=DAILY_TRANSACTION_LIMIT_MESSAGE,
-            )
-
+        # Lookup employee + tenant dan INSERT dalam satu statement; batas 1 transaksi
+        # per hari dijaga oleh unique index (card_number, transaction_day).
         cursor.execute(
             """
             INSERT INTO transactions (
@@ -999,20 +1276,50 @@ def create_transaction(
                 transaction_date,
                 transaction_day
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            SELECT
+                e.card_number,
+                e.employee_id,
+                e.name,
+                e.employee_group,
+                t.id,
+                t.name,
+                ?,
+                ?
+            FROM employees e, tenants t
+            WHERE e.employee_id = ? AND t.id = ?
+            LIMIT 1
+            RETURNING employee_name
             """,
             (
-                employee_card_number,
-                transaction_data.employee_id,
-                employee_name,
-                employee_group,
-                transaction_data.tenant_id,
-                tenant_name,
                 normalized_transaction_date,
                 transaction_day,
+                transaction_data.employee_id,
+                transaction_data.tenant_id,
             ),
         )
+        inserted = cursor.fetchone()
+        if inserted is None:
+            cursor.execute(
+                """
+                SELECT
+                    EXISTS(SELECT 1 FROM employees WHERE employee_id = ?) AS employee_exists,
+                    EXISTS(SELECT 1 FROM tenants WHERE id = ?) AS tenant_exists
+                """,
+                (transaction_data.employee_id, transaction_data.tenant_id),
+            )
+            found = cursor.fetchone()
+            if not found["employee_exists"]:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Employee with ID '{transaction_data.employee_id}' not found",
+                )
+            raise HTTPException(
+                status_code=404,
+                detail=f"Tenant with ID '{transaction_data.tenant_id}' not found",
+            )
+        employee_name = inserted["employee_name"]
         conn.commit()
+        _report_count_cache.clear()
         server_commit_ts = int(time.time() * 1000)
 
         sse_payload = {
@@ -1023,10 +1330,7 @@ def create_transaction(
             "server_commit_ts": server_commit_ts,
         }
         if sse_manager.main_event_loop:
-            asyncio.run_coroutine_threadsafe(
-                sse_manager.trigger_sse_event_async(sse_payload),
-                sse_manager.main_event_loop,
-            )
+            sse_manager.publish(sse_payload)
 
         success = True
         return {"message": "Transaction logged successfully."}
@@ -1052,7 +1356,7 @@ def create_transaction(
             detail=f"Failed to log transaction: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
         duration_ms = (time.perf_counter() - start_time) * 1000
         status_label = "ok" if success else "failed"
         print(
@@ -1061,19 +1365,22 @@ def create_transaction(
 
 
 @router.post("/preorder", status_code=status.HTTP_201_CREATED)
-def create_preorder(preorder: PreorderCreateRequest, background_tasks: BackgroundTasks):
+def create_preorder(preorder: PreorderCreateRequest):
     now_dt = datetime.datetime.now()
-    if not canteen_is_open(now_dt):
-        canteen_status = get_canteen_status(now_dt)
+    # Satu lookup mode: status lengkap sudah berisi is_open dan pesan penolakannya.
+    canteen_status = get_canteen_status(now_dt)
+    if not canteen_status["is_open"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=canteen_status["message"],
         )
 
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
-        conn.execute("BEGIN IMMEDIATE TRANSACTION")
+        # Data pegawai dibaca sebelum write lock; yang menentukan nomor antrean dan
+        # duplikat (transaksi/pre-order/kuota hari ini) dibaca ulang di dalam
+        # BEGIN IMMEDIATE, jadi writer lain hanya menunggu selama cek + 2 INSERT.
         cursor.execute(
             """
             SELECT employee_id, card_number, name, is_disabled, is_blocked, email, employee_group
@@ -1094,27 +1401,19 @@ def create_preorder(preorder: PreorderCreateRequest, background_tasks: Backgroun
                 )
 
         card_number = employee["card_number"] or ""
-        today = datetime.datetime.now(tz=JAKARTA_TZ).date().isoformat()
+        # Satu pembacaan jam per request: now_dt (waktu lokal server) dikonversi ke Jakarta.
+        # WIB tanpa DST, jadi offset tetap cukup (tanpa lookup transisi ZoneInfo).
+        order_datetime = now_dt.astimezone(_JAKARTA_FIXED_TZ)
+        today = order_datetime.date().isoformat()
 
+        conn.execute("BEGIN IMMEDIATE TRANSACTION")
         if _card_has_transaction_for_day(cursor, card_number, today):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=DAILY_TRANSACTION_LIMIT_MESSAGE,
             )
 
-        employee_email = (employee["email"] or "").strip()
-        if not employee_email:
-            employee_email = update_employee_email(preorder.employee_id)
-            if not employee_email:
-                print(
-                    f"Peringatan: email untuk employee_id {preorder.employee_id} tidak ditemukan di DB maupun dummy mapping."
-                )
-
-        cursor.execute(
-            "SELECT id, name, quota, is_limited, verification_code FROM tenants WHERE id = ?",
-            (preorder.tenant_id,),
-        )
-        tenant = cursor.fetchone()
+        tenant = _get_tenant_cached(cursor, preorder.tenant_id)
         if not tenant:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1122,166 +1421,49 @@ def create_preorder(preorder: PreorderCreateRequest, background_tasks: Backgroun
             )
 
         tenant_prefix = get_tenant_prefix(tenant["name"])
-        try:
-            quota_state = evaluate_tenant_quota_for_today(conn, tenant["id"])
-        except ValueError as exc:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=str(exc),
-            )
-
-        if not quota_state["can_order_for_target"]:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Kuota tenant ini sudah habis sementara tenant lain masih memiliki sisa.",
-            )
-
-        day_start, day_end = _get_local_day_bounds_from_string(today)
+        # Satu round-trip: pre-order hari ini, jumlah transaksi tenant hari ini, dan
+        # apakah masih ada tenant berkuota yang belum penuh (sebelumnya tiga query,
+        # termasuk evaluate_tenant_quota_for_today yang membaca semua tenant).
         cursor.execute(
-            """
-            SELECT 1
-            FROM preorders
-            WHERE employee_id = ?
-              AND order_date = ?
-            LIMIT 1
-            """,
-            (preorder.employee_id, today),
+            _SQL_PREORDER_STATE,
+            (preorder.employee_id, today, tenant["id"], today, today),
         )
-        if cursor.fetchone():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Anda sudah melakukan pre-order hari ini. Hanya satu order per hari yang diperbolehkan.",
-            )
+        already_ordered, tenant_count, any_tenant_with_remaining = cursor.fetchone()
 
-        cursor.execute(
-            """
-            SELECT id
-            FROM preorders
-            WHERE employee_id = ?
-              AND tenant_id = ?
-              AND order_date = ?
-              AND menu_label = ?
-              AND created_at >= datetime('now','localtime','-15 seconds')
-            ORDER BY id DESC
-            LIMIT 1
-            """,
-            (
-                preorder.employee_id,
-                preorder.tenant_id,
-                today,
-                preorder.menu_label,
-            ),
-        )
-        if cursor.fetchone():
+        quota_value = tenant["quota"] or 0
+        if quota_value > 0 and tenant_count >= quota_value and any_tenant_with_remaining:
             raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Pesanan ini sudah tercatat. Kemungkinan Anda menekan tombol dua kali atau membuka lebih dari satu tab.",
-            )
-
-        tenant_verification_code = tenant["verification_code"]
-
-        cursor.execute(
-            """
-            SELECT COUNT(*)
-            FROM transactions
-            WHERE tenant_id = ?
-              AND transaction_date >= ?
-              AND transaction_date < ?
-            """,
-            (preorder.tenant_id, day_start, day_end),
-        )
-        order_count_today = cursor.fetchone()[0] + 1
-        transaction_number = order_count_today
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Kuota tenant ini sudah habis sementara tenant lain masih memiliki sisa.",
+            )
+        if already_ordered:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Anda sudah melakukan pre-order hari ini. Hanya satu order per hari yang diperbolehkan.",
+            )
 
-        quota_value = tenant["quota"] or 0
+        tenant_verification_code = tenant["verification_code"]
+        order_count_today = tenant_count + 1
+        transaction_number = order_count_today
 
-        if quota_value > 0:
-            remaining_before_new_order = quota_value - (order_count_today - 1)
-            if remaining_before_new_order <= 0:
-                cursor.execute(
-                    """
-                    SELECT t.id,
-                           t.quota,
-                           COALESCE(tx.order_count, 0) AS order_count
-                    FROM tenants t
-                    LEFT JOIN (
-                        SELECT tenant_id, COUNT(*) AS order_count
-                        FROM transactions
-                        WHERE transaction_date >= ?
-                          AND transaction_date < ?
-                        GROUP BY tenant_id
-                    ) tx ON tx.tenant_id = t.id
-                    WHERE t.quota IS NOT NULL AND t.quota > 0
-                    """,
-                    (day_start, day_end),
-                )
-                tenants_with_quota = cursor.fetchall()
-                any_tenant_with_remaining = False
-                for tenant_row in tenants_with_quota:
-                    tenant_quota = tenant_row["quota"] or 0
-                    orders_taken = tenant_row["order_count"] or 0
-                    if tenant_quota - orders_taken > 0:
-                        any_tenant_with_remaining = True
-                        break
-
-                if any_tenant_with_remaining:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Kuota tenant ini sudah habis. Silakan pilih tenant lain yang masih tersedia.",
-                    )
         remaining_after = quota_value - order_count_today
+        has_quota = quota_value > 0
 
-        if quota_value > 0:
-            if remaining_after >= 0:
-                queue_number = remaining_after + 1
-            else:
-                queue_number = remaining_after
-        else:
-            queue_number = remaining_after
-
-        if queue_number is None:
-            queue_code = "-"
-        elif tenant_prefix:
-            queue_code = f"{tenant_prefix}{queue_number}"
-        else:
-            queue_code = str(queue_number)
-
-        remaining_quota: Optional[int] = None
-        if quota_value > 0:
-            remaining_quota = remaining_after
+        # Nomor antrean = sisa kuota + 1 selama kuota masih ada, selain itu sisa (negatif).
+        queue_number = (
+            remaining_after + 1 if has_quota and remaining_after >= 0 else remaining_after
+        )
+        queue_code = f"{tenant_prefix}{queue_number}"
+        remaining_quota: Optional[int] = remaining_after if has_quota else None
 
-        order_code = uuid4().hex
-        order_datetime = datetime.datetime.now(tz=JAKARTA_TZ)
-        transaction_timestamp = order_datetime.strftime("%Y-%m-%d %H:%M:%S")
+        order_code = _new_order_code()
+        # transaction_number selalu >= 1 (COUNT + 1).
+        transaction_timestamp, ticket_number, order_datetime_text = _format_order_meta(
+            order_datetime, transaction_number
+        )
         transaction_day = today
-        ticket_number = generate_ticket_number(order_datetime, transaction_number)
-        weekday_names = [
-            "Senin",
-            "Selasa",
-            "Rabu",
-            "Kamis",
-            "Jumat",
-            "Sabtu",
-            "Minggu",
-        ]
-        weekday_name = weekday_names[order_datetime.weekday()]
-        order_datetime_text = f"{weekday_name} {order_datetime.strftime('%d/%m/%Y, %H.%M')}"
         cursor.execute(
-            """
-            INSERT INTO preorders (
-                order_code,
-                ticket_number,
-                employee_id,
-                card_number,
-                employee_name,
-                tenant_id,
-                tenant_name,
-                menu_label,
-                order_date,
-                status,
-                queue_number
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'PENDING', ?)
-            """,
+            _SQL_INSERT_PREORDER,
             (
                 order_code,
                 ticket_number,
@@ -1296,18 +1478,7 @@ def create_preorder(preorder: PreorderCreateRequest, background_tasks: Backgroun
             ),
         )
         cursor.execute(
-            """
-            INSERT INTO transactions (
-                card_number,
-                employee_id,
-                employee_name,
-                employee_group,
-                tenant_id,
-                tenant_name,
-                transaction_date,
-                transaction_day
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
+            _SQL_INSERT_TRANSACTION,
             (
                 card_number,
                 preorder.employee_id,
@@ -1320,8 +1491,19 @@ def create_preorder(preorder: PreorderCreateRequest, background_tasks: Backgroun
             ),
         )
         conn.commit()
+        _dashboard_cache.invalidate(DASHBOARD_CACHE_KEY)
+        _report_count_cache.clear()
         server_commit_ts = int(time.time() * 1000)
 
+        # Lookup/isi email setelah commit: tidak lagi memegang write lock pre-order.
+        employee_email = (employee["email"] or "").strip()
+        if not employee_email:
+            employee_email = update_employee_email(preorder.employee_id)
+            if not employee_email:
+                print(
+                    f"Peringatan: email untuk employee_id {preorder.employee_id} tidak ditemukan di DB maupun dummy mapping."
+                )
+
         # Trigger SSE to update monitoring dashboard after pre-order/transaction creation
         if sse_manager.main_event_loop:
             sse_payload = {
@@ -1331,10 +1513,7 @@ def create_preorder(preorder: PreorderCreateRequest, background_tasks: Backgroun
                 "tap_id": None,
                 "server_commit_ts": server_commit_ts,
             }
-            asyncio.run_coroutine_threadsafe(
-                sse_manager.trigger_sse_event_async(sse_payload),
-                sse_manager.main_event_loop,
-            )
+            sse_manager.publish(sse_payload)
 
         order_payload = {
             "ticket_number": ticket_number,
@@ -1352,22 +1531,12 @@ def create_preorder(preorder: PreorderCreateRequest, background_tasks: Backgroun
             "transaction_number": ticket_number,
         }
         if employee_email:
-            background_tasks.add_task(
-                send_order_confirmation,
-                employee_email,
-                order_payload,
-                recipient="employee",
-            )
+            mail_queue.enqueue(employee_email, order_payload, recipient="employee")
         canteen_email = os.getenv("CANTEEN_ORDER_EMAIL")
         if canteen_email:
-            background_tasks.add_task(
-                send_order_confirmation,
-                canteen_email,
-                order_payload,
-                recipient="canteen",
-            )
+            mail_queue.enqueue(canteen_email, order_payload, recipient="canteen")
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "orderCode": ticket_number,
                 "orderHash": order_code,
@@ -1395,7 +1564,7 @@ def create_preorder(preorder: PreorderCreateRequest, background_tasks: Backgroun
             detail=f"Gagal membuat pre-order: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 # DEPRECATED: Endpoint admin sekali-jalan untuk mengirim token karyawan via email.
@@ -1409,23 +1578,16 @@ def send_employee_tokens(_: dict[str, Any] = Depends(require_admin_access)):
 
 
 @router.get("/transaction/check_duplicate", status_code=status.HTTP_200_OK)
-async def check_duplicate_transaction(
+def check_duplicate_transaction(
     card_number: str = Query(..., alias="cardNumber"),
     transaction_date: str = Query(..., alias="transactionDate"),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout("read")
     cursor = conn.cursor()
-    day_start, day_end = _get_local_day_bounds_from_string(transaction_date)
+    # Probe tunggal pada unique index (card_number, transaction_day), bukan range tanggal.
+    transaction_day = _get_local_day_from_string(transaction_date)
     try:
-        cursor.execute(
-            """
-            SELECT 1 FROM transactions
-            WHERE card_number = ?
-              AND transaction_date >= ?
-              AND transaction_date < ?
-            """,
-            (card_number, day_start, day_end),
-        )
+        cursor.execute(_SQL_CARD_DAY_EXISTS, (card_number, transaction_day))
         exists = cursor.fetchone() is not None
         return {"exists": exists}
     except Exception as e:
@@ -1434,28 +1596,19 @@ async def check_duplicate_transaction(
             detail=f"Failed to check duplicate transaction: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 @router.get("/transaction/daily_count", status_code=status.HTTP_200_OK)
-async def get_daily_transaction_count(
+def get_daily_transaction_count(
     tenant_id: int = Query(..., alias="tenantId"),
     transaction_date: str = Query(..., alias="transactionDate"),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout("read")
     cursor = conn.cursor()
-    day_start, day_end = _get_local_day_bounds_from_string(transaction_date)
+    transaction_day = _get_local_day_from_string(transaction_date)
     try:
-        cursor.execute(
-            """
-            SELECT COUNT(*)
-            FROM transactions
-            WHERE tenant_id = ?
-              AND transaction_date >= ?
-              AND transaction_date < ?
-            """,
-            (tenant_id, day_start, day_end),
-        )
+        cursor.execute(_SQL_TENANT_DAY_COUNT, (tenant_id, transaction_day))
         count = cursor.fetchone()[0]
         return {"count": count}
     except Exception as e:
@@ -1464,23 +1617,23 @@ async def get_daily_transaction_count(
             detail=f"Failed to get daily transaction count: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 @router.get("/transaction/{transaction_id}/detail", status_code=status.HTTP_200_OK)
 def get_transaction(
     transaction_id: int, _: dict[str, Any] = Depends(require_admin_access)
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout("read")
     cursor = conn.cursor()
     try:
         cursor.execute("SELECT * FROM transactions WHERE id = ?", (transaction_id,))
         transaction = cursor.fetchone()
         if not transaction:
             raise HTTPException(status_code=404, detail="Transaction not found")
-        return JSONResponse(content=dict(transaction))
+        return ORJSONResponse(content=dict(transaction))
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 @router.put("/transaction/{transaction_id}/update", status_code=status.HTTP_200_OK)
@@ -1489,16 +1642,17 @@ def update_transaction(
     transaction_data: TransactionUpdateRequest,
     _: dict[str, Any] = Depends(require_admin_access),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
-        update_data_dict = transaction_data.dict(by_alias=True, exclude_unset=True)
+        update_data_dict = transaction_data.model_dump(by_alias=True, exclude_unset=True)
         if not update_data_dict:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="No fields to update"
             )
 
         update_fields = {}
+        field_mask = 0
 
         if "employeeId" in update_data_dict:
             employee_id = update_data_dict["employeeId"]
@@ -1516,6 +1670,7 @@ def update_transaction(
             update_fields["card_number"] = employee["card_number"]
             update_fields["employee_name"] = employee["name"]
             update_fields["employee_group"] = employee["employee_group"]
+            field_mask |= 1
 
         if "tenantId" in update_data_dict:
             tenant_id = update_data_dict["tenantId"]
@@ -1528,24 +1683,46 @@ def update_transaction(
                 )
             update_fields["tenant_id"] = tenant_id
             update_fields["tenant_name"] = tenant["name"]
+            field_mask |= 2
 
         if "transactionDate" in update_data_dict:
-            update_fields["transaction_date"] = update_data_dict["transactionDate"]
+            # Dinormalisasi ke waktu Jakarta seperti create_transaction / TAP;
+            # transaction_day ikut diperbarui karena unique index per hari dan
+            # hitungan kuota membaca kolom ini, bukan transaction_date.
+            _, transaction_date_text, transaction_day = _normalize_timestamp_to_local(
+                update_data_dict["transactionDate"], field_name="transactionDate"
+            )
+            update_fields["transaction_date"] = transaction_date_text
+            update_fields["transaction_day"] = transaction_day
+            field_mask |= 4
 
-        if not update_fields:
+        if not field_mask:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="No valid fields to update",
             )
 
-        set_clause = ", ".join([f"{key} = ?" for key in update_fields.keys()])
-        query = f"UPDATE transactions SET {set_clause} WHERE id = ?"
-        params = list(update_fields.values()) + [transaction_id]
+        query, columns = UPDATE_TRANSACTION_SQL[field_mask]
+        params = [update_fields[column] for column in columns]
+        params.append(transaction_id)
 
-        cursor.execute(query, tuple(params))
+        cursor.execute(query, params)
         conn.commit()
+        _report_count_cache.clear()
 
         return {"message": "Transaction updated successfully."}
+    except sqlite3.IntegrityError as exc:
+        conn.rollback()
+        error_text = str(exc).lower()
+        if "unique" in error_text or "transaction_day" in error_text:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=DAILY_TRANSACTION_LIMIT_MESSAGE,
+            )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to update transaction: {exc}",
+        )
     except HTTPException:
         conn.rollback()
         raise
@@ -1556,18 +1733,19 @@ def update_transaction(
             detail=f"Failed to update transaction: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 @router.delete("/transaction/{transaction_id}/delete", status_code=status.HTTP_200_OK)
 def delete_transaction(
     transaction_id: int, _: dict[str, Any] = Depends(require_admin_access)
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
         cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
         conn.commit()
+        _report_count_cache.clear()
         return {"message": "Transaction deleted successfully."}
     except Exception as e:
         conn.rollback()
@@ -1576,12 +1754,12 @@ def delete_transaction(
             detail=f"Failed to delete transaction: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 @router.delete("/device/all", status_code=status.HTTP_200_OK)
-async def delete_all_devices():
-    conn = get_db_connection()
+def delete_all_devices():
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
         cursor.execute("DELETE FROM devices")
@@ -1594,12 +1772,12 @@ async def delete_all_devices():
             detail=f"Failed to delete all devices: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 @router.post("/device/setup", status_code=status.HTTP_200_OK)
-async def setup_devices_table():
-    conn = get_db_connection()
+def setup_devices_table():
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
         cursor.execute(
@@ -1621,12 +1799,12 @@ async def setup_devices_table():
             detail=f"Failed to setup devices table: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 @router.get("/device/check/{device_code}", status_code=status.HTTP_200_OK)
-async def check_device_exists(device_code: str):
-    conn = get_db_connection()
+def check_device_exists(device_code: str):
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
         cursor.execute("SELECT 1 FROM devices WHERE device_code = ?", (device_code,))
@@ -1638,29 +1816,32 @@ async def check_device_exists(device_code: str):
             detail=f"Failed to check device existence: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 @router.post("/device", status_code=status.HTTP_201_CREATED)
-async def register_new_device(
+def register_new_device(
     device_data: DeviceCreateRequest,
     _: dict[str, Any] = Depends(require_admin_access),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
+        # Cek + insert dalam satu statement (atomik di bawah write lock SQLite).
+        # Tidak memakai ON CONFLICT karena database lama tidak punya UNIQUE pada device_code.
         cursor.execute(
-            "SELECT 1 FROM devices WHERE device_code = ?", (device_data.device_code,)
+            """
+            INSERT INTO devices (device_code)
+            SELECT ?
+            WHERE NOT EXISTS (SELECT 1 FROM devices WHERE device_code = ?)
+            """,
+            (device_data.device_code, device_data.device_code),
         )
-        if cursor.fetchone():
+        if cursor.rowcount == 0:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail=f"Device '{device_data.device_code}' already registered.",
             )
-
-        cursor.execute(
-            "INSERT INTO devices (device_code) VALUES (?)", (device_data.device_code,)
-        )
         conn.commit()
         return {
             "message": f"Device '{device_data.device_code}' registered successfully."
@@ -1674,7 +1855,7 @@ async def register_new_device(
             detail=f"Failed to register device: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 @router.get("/sse")
@@ -1689,41 +1870,90 @@ async def sse_endpoint(request: Request):
     )
 
 
+class _PooledStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse yang memegang koneksi pool: koneksi dikembalikan apa pun jalannya
+    response (selesai, client putus sebelum body dikirim, atau error saat streaming).
+    """
+
+    def __init__(self, content: Any, release: Callable[[], None], **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+
+def _stream_json_rows(cursor: sqlite3.Cursor, release: Callable[[], None], chunk_size: int = 500):
+    """
+    Stream hasil cursor sebagai JSON array per chunk (orjson) tanpa membangun list penuh.
+    `release` dipanggil begitu stream selesai; response juga memanggilnya (idempoten).
+    """
+    try:
+        yield b"["
+        first = True
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = b",".join(orjson.dumps(row) for row in rows)
+            yield chunk if first else b"," + chunk
+            first = False
+        yield b"]"
+    finally:
+        release()
+
+
 @router.get("/employee")
-async def get_employees(_: dict[str, Any] = Depends(require_admin_access)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def get_employees(_: dict[str, Any] = Depends(require_admin_access)):
+    conn = db_pool.checkout("read")
+    release = db_pool.releaser(conn)
     try:
+        cursor = conn.cursor()
+        cursor.row_factory = dict_factory
         cursor.execute("SELECT * FROM employees ORDER BY name")
-        employees = [dict(row) for row in cursor.fetchall()]
-        return JSONResponse(content=employees)
-    finally:
-        conn.close()
+    except Exception:
+        release()
+        raise
+    return _PooledStreamingResponse(
+        _stream_json_rows(cursor, release), release, media_type="application/json"
+    )
 
 
 @router.get("/tenant")
-async def get_tenants(_: dict[str, Any] = Depends(require_admin_access)):
-    conn = get_db_connection()
+def get_tenants(_: dict[str, Any] = Depends(require_admin_access)):
+    body = _tenant_list_cache.get(TENANT_LIST_CACHE_KEY)
+    if body is not None:
+        return RawJSONResponse(content=body)
+
+    conn = db_pool.checkout("read")
     cursor = conn.cursor()
     try:
+        cursor.row_factory = dict_factory
         cursor.execute("SELECT * FROM tenants ORDER BY name")
-        tenants_list = [dict(row) for row in cursor.fetchall()]
+        tenants_list = cursor.fetchall()
 
-        for tenant in tenants_list:
-            cursor.execute(
-                "SELECT menu FROM tenant_menu WHERE tenant_id = ?", (tenant["id"],)
-            )
-            menus = cursor.fetchall()
-            tenant["menu"] = [row["menu"] for row in menus]
+        # Semua tenant diambil, jadi menu cukup diambil sekali lalu dikelompokkan per tenant.
+        all_menus: dict[int, list] = {}
+        cursor.execute("SELECT tenant_id, menu FROM tenant_menu ORDER BY id")
+        for menu_row in cursor.fetchall():
+            all_menus.setdefault(menu_row["tenant_id"], []).append(menu_row["menu"])
 
-        return JSONResponse(content=tenants_list)
+        for tenant in tenants_list:
+            tenant["menu"] = all_menus.get(tenant["id"], [])
     finally:
-        conn.close()
+        db_pool.release(conn)
+    body = dumps_json(tenants_list)
+    _tenant_list_cache.set(TENANT_LIST_CACHE_KEY, body)
+    return RawJSONResponse(content=body)
 
 
 @router.get("/device")
-async def get_devices(_: dict[str, Any] = Depends(require_admin_access)):
-    conn = get_db_connection()
+def get_devices(_: dict[str, Any] = Depends(require_admin_access)):
+    conn = db_pool.checkout("read")
     cursor = conn.cursor()
     try:
 
@@ -1746,7 +1976,7 @@ async def get_devices(_: dict[str, Any] = Depends(require_admin_access)):
                 tenant_info = {"id": row["tenant_id"], "name": row["tenant_name"]}
             devices.append({"device_code": row["device_code"], "tenant": tenant_info})
 
-        return JSONResponse(content=devices)
+        return ORJSONResponse(content=devices)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1754,96 +1984,91 @@ async def get_devices(_: dict[str, Any] = Depends(require_admin_access)):
         )
     finally:
         if conn:
-            conn.close()
+            db_pool.release(conn)
 
 
 @router.get("/dashboard/overview", status_code=status.HTTP_200_OK)
-def get_dashboard_overview():
+async def get_dashboard_overview():
     """
     Provides a dashboard overview of all devices with assigned tenants,
     including tenant details, menu, and today's transaction count.
+    Cache hit dijawab langsung di event loop; hanya cache miss yang memakai thread DB.
     """
-    conn = get_db_connection()
+    # Cache menyimpan body JSON yang sudah di-encode: semua monitor yang polling
+    # dalam TTL yang sama menerima bytes yang sama tanpa encode ulang.
+    body = _dashboard_cache.get(DASHBOARD_CACHE_KEY)
+    if body is None:
+        body = dumps_json(await db_pool.run(_load_dashboard_overview))
+        _dashboard_cache.set(DASHBOARD_CACHE_KEY, body)
+    return RawJSONResponse(content=body)
+
+
+def _load_dashboard_overview() -> List[dict[str, Any]]:
+    conn = db_pool.checkout("read")
     cursor = conn.cursor()
     try:
-        today = datetime.date.today().isoformat()
         day_start, day_end = _get_local_day_bounds_from_string()
 
-        query = """
+        # Satu query untuk semua device: jumlah transaksi hari ini, transaksi terakhir,
+        # dan menu per tenant (sebelumnya 2 query per device). Jumlah per tenant dihitung
+        # di idx_transactions_tenant_day, transaksi terakhir lewat idx_transactions_tenant_date
+        # (LIMIT 1 dari ujung index), bukan ROW_NUMBER() atas semua transaksi hari ini.
+        cursor.execute(
+            """
             SELECT
                 d.device_code,
                 t.id AS tenant_id,
                 t.name AS tenant_name,
                 COALESCE(t.quota, 0) AS quota,
-                t.verification_code
+                t.verification_code,
+                (
+                    SELECT COUNT(*)
+                    FROM transactions
+                    WHERE tenant_id = t.id
+                      AND transaction_day = ?
+                ) AS ordered_count,
+                lo.id AS last_order_id,
+                lo.employee_name AS last_employee_name,
+                lo.employee_id AS last_employee_id,
+                (
+                    SELECT GROUP_CONCAT(menu, CHAR(31))
+                    FROM tenant_menu
+                    WHERE tenant_id = t.id
+                ) AS menus
             FROM
                 devices d
             JOIN
                 tenants t ON d.tenant_id = t.id
+            LEFT JOIN
+                transactions lo ON lo.id = (
+                    SELECT id
+                    FROM transactions
+                    WHERE tenant_id = t.id
+                      AND transaction_date >= ? AND transaction_date < ?
+                    ORDER BY transaction_date DESC, id DESC
+                    LIMIT 1
+                )
             WHERE
                 d.tenant_id IS NOT NULL
             ORDER BY
                 d.tenant_id
-        """
-        cursor.execute(query)
-
-        devices_with_tenants = cursor.fetchall()
+            """,
+            (day_start[:10], day_start, day_end),
+        )
 
         result = []
-        tenant_ids = list(set(row["tenant_id"] for row in devices_with_tenants))
-
-        all_menus = {}
-        if tenant_ids:
-            placeholders = ",".join("?" for _ in tenant_ids)
-            menu_query = f"SELECT tenant_id, menu FROM tenant_menu WHERE tenant_id IN ({placeholders})"
-            cursor.execute(menu_query, tenant_ids)
-
-            for menu_row in cursor.fetchall():
-                tid = menu_row["tenant_id"]
-                if tid not in all_menus:
-                    all_menus[tid] = []
-                all_menus[tid].append(menu_row["menu"])
-
-        for row in devices_with_tenants:
+        for row in cursor.fetchall():
             tenant_id = row["tenant_id"]
+            ordered = int(row["ordered_count"])
+            menus = row["menus"].split("\x1f") if row["menus"] else []
 
-            cursor.execute(
-                """
-                SELECT COALESCE(COUNT(*), 0) AS ordered_count
-                FROM transactions
-                WHERE tenant_id = ?
-                  AND transaction_date >= ?
-                  AND transaction_date < ?
-                """,
-                (tenant_id, day_start, day_end),
-            )
-            ordered_row = cursor.fetchone()
-            ordered = int(ordered_row["ordered_count"]) if ordered_row else 0
-
-            cursor.execute(
-                """
-                SELECT
-                    tr.employee_name,
-                    tr.employee_id,
-                    tr.transaction_date,
-                    tr.id
-                FROM transactions tr
-                WHERE tr.tenant_id = ?
-                  AND tr.transaction_date >= ?
-                  AND tr.transaction_date < ?
-                ORDER BY tr.transaction_date DESC, tr.id DESC
-                LIMIT 1
-                """,
-                (tenant_id, day_start, day_end),
-            )
-            last_order_row = cursor.fetchone()
             last_order = None
-            if last_order_row:
+            if row["last_order_id"] is not None:
                 last_order = {
                     "queueNumber": None,
                     "menuLabel": None,
-                    "employeeName": last_order_row["employee_name"],
-                    "employeeId": last_order_row["employee_id"],
+                    "employeeName": row["last_employee_name"],
+                    "employeeId": row["last_employee_id"],
                 }
 
             quota_value = int(row["quota"] or 0)
@@ -1862,7 +2087,7 @@ def get_dashboard_overview():
                 "tenant": {
                     "id": tenant_id,
                     "name": row["tenant_name"],
-                    "menu": all_menus.get(tenant_id, []),
+                    "menu": menus,
                     "quota": quota_value,
                     "ordered": ordered,
                     "available": available,
@@ -1872,7 +2097,7 @@ def get_dashboard_overview():
             }
             result.append(device_info)
 
-        return JSONResponse(content=result)
+        return result
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1880,20 +2105,22 @@ def get_dashboard_overview():
         )
     finally:
         if conn:
-            conn.close()
+            db_pool.release(conn)
 
 
 @router.get("/device/assigned")
-async def get_assigned_devices_with_menu(
+def get_assigned_devices_with_menu(
     _: dict[str, Any] = Depends(require_admin_access),
 ):
     """
     Returns a list of all devices that have an assigned tenant,
     including the tenant's full details and menu.
     """
-    conn = get_db_connection()
+    conn = db_pool.checkout("read")
     cursor = conn.cursor()
     try:
+        # Device + tenant satu baris per device, menu diambil terpisah lalu digabung di
+        # Python; JOIN ke tenant_menu sebelumnya mengulang kolom device/tenant per menu.
         cursor.execute(
             """
             SELECT
@@ -1901,41 +2128,49 @@ async def get_assigned_devices_with_menu(
                 t.id AS tenant_id,
                 t.name AS tenant_name,
                 t.quota,
-                t.is_limited,
-                tm.menu
+                t.is_limited
             FROM
                 devices d
             INNER JOIN
                 tenants t ON d.tenant_id = t.id
-            LEFT JOIN
-                tenant_menu tm ON t.id = tm.tenant_id
             WHERE
                 d.tenant_id IS NOT NULL
             ORDER BY
                 d.device_code, t.id
         """
         )
+        device_rows = cursor.fetchall()
 
-        assigned_devices = {}
-        for row in cursor.fetchall():
-            device_code = row["device_code"]
-
-            if device_code not in assigned_devices:
-                assigned_devices[device_code] = {
-                    "device_code": device_code,
-                    "tenant": {
-                        "id": row["tenant_id"],
-                        "name": row["tenant_name"],
-                        "quota": row["quota"],
-                        "is_limited": row["is_limited"],
-                        "menu": [],
-                    },
-                }
+        cursor.execute(
+            """
+            SELECT tenant_id, menu
+            FROM tenant_menu
+            WHERE tenant_id IN (
+                SELECT tenant_id FROM devices WHERE tenant_id IS NOT NULL
+            )
+            ORDER BY tenant_id, id
+            """
+        )
+        menus_by_tenant: dict[int, List[str]] = {}
+        for tenant_id, menu in cursor.fetchall():
+            menus_by_tenant.setdefault(tenant_id, []).append(menu)
 
-            if row["menu"] is not None:
-                assigned_devices[device_code]["tenant"]["menu"].append(row["menu"])
+        assigned_devices = {}
+        for device_code, tenant_id, tenant_name, quota, is_limited in device_rows:
+            if device_code in assigned_devices:
+                continue
+            assigned_devices[device_code] = {
+                "device_code": device_code,
+                "tenant": {
+                    "id": tenant_id,
+                    "name": tenant_name,
+                    "quota": quota,
+                    "is_limited": is_limited,
+                    "menu": list(menus_by_tenant.get(tenant_id, ())),
+                },
+            }
 
-        return JSONResponse(content=list(assigned_devices.values()))
+        return ORJSONResponse(content=list(assigned_devices.values()))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1943,16 +2178,16 @@ async def get_assigned_devices_with_menu(
         )
     finally:
         if conn:
-            conn.close()
+            db_pool.release(conn)
 
 
 @router.put("/device/{device_code}")
-async def update_device_tenant(
+def update_device_tenant(
     device_code: str,
     update_data: DeviceUpdateRequest,
     _: dict[str, Any] = Depends(require_admin_access),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
         cursor.execute(
@@ -1960,6 +2195,7 @@ async def update_device_tenant(
             (update_data.tenant_id, device_code),
         )
         conn.commit()
+        _dashboard_cache.invalidate(DASHBOARD_CACHE_KEY)
     except Exception as e:
         conn.rollback()
         raise HTTPException(
@@ -1967,23 +2203,25 @@ async def update_device_tenant(
             detail=f"Failed to update device: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
-    return JSONResponse(
+    return ORJSONResponse(
         content={"message": f"Device '{device_code}' updated successfully."},
         status_code=status.HTTP_200_OK,
     )
 
 
 @router.post("/tenant", status_code=status.HTTP_201_CREATED)
-async def create_tenant(
+def create_tenant(
     create_data: TenantCreateRequest,
     _: dict[str, Any] = Depends(require_admin_access),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
         verification_code = generate_verification_code()
+        # Tenant + menu dalam satu transaksi tulis (satu commit/fsync WAL).
+        cursor.execute("BEGIN IMMEDIATE")
         cursor.execute(
             "INSERT INTO tenants (name, quota, is_limited, verification_code) VALUES (?, ?, ?, ?)",
             (
@@ -1996,16 +2234,14 @@ async def create_tenant(
         new_tenant_id = cursor.lastrowid
 
         if create_data.menu:
-            menu_items = [(new_tenant_id, item) for item in create_data.menu]
-            cursor.executemany(
-                "INSERT INTO tenant_menu (tenant_id, menu) VALUES (?, ?)", menu_items
-            )
+            _insert_tenant_menu(cursor, new_tenant_id, create_data.menu)
         conn.commit()
+        _invalidate_tenant_caches(new_tenant_id)
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        conn.close()
+        db_pool.release(conn)
     return {
         "message": "Tenant created successfully",
         "tenantId": new_tenant_id,
@@ -2014,14 +2250,16 @@ async def create_tenant(
 
 
 @router.put("/tenant/{tenant_id}/update")
-async def update_tenant(
+def update_tenant(
     tenant_id: int,
     update_data: TenantUpdateRequest,
     _: dict[str, Any] = Depends(require_admin_access),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
+        # Ambil write lock di awal: SELECT + UPDATE + diff menu satu transaksi.
+        cursor.execute("BEGIN IMMEDIATE")
         cursor.execute(
             "SELECT verification_code FROM tenants WHERE id = ?",
             (tenant_id,),
@@ -2039,20 +2277,15 @@ async def update_tenant(
             ),
         )
 
-        cursor.execute("DELETE FROM tenant_menu WHERE tenant_id = ?", (tenant_id,))
-
-        if update_data.menu:
-            menu_items = [(tenant_id, item) for item in update_data.menu]
-            cursor.executemany(
-                "INSERT INTO tenant_menu (tenant_id, menu) VALUES (?, ?)", menu_items
-            )
+        _sync_tenant_menu(cursor, tenant_id, update_data.menu or [])
 
         conn.commit()
+        _invalidate_tenant_caches(tenant_id)
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        conn.close()
+        db_pool.release(conn)
     return {
         "message": "Tenant updated successfully",
         "verificationCode": verification_code,
@@ -2060,13 +2293,15 @@ async def update_tenant(
 
 
 @router.get("/tenant/{tenant_id}/detail")
-async def get_tenant(
+def get_tenant(
     tenant_id: int, _: dict[str, Any] = Depends(require_admin_access)
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT * FROM tenants WHERE id = ?", (tenant_id,))
+        cursor.execute(
+            "SELECT id, name, quota, is_limited FROM tenants WHERE id = ?", (tenant_id,)
+        )
         tenant = cursor.fetchone()
         if not tenant:
             raise HTTPException(status_code=404, detail="Tenant not found")
@@ -2085,54 +2320,52 @@ async def get_tenant(
         tenant_dict["menu"] = [row["menu"] for row in menus]
 
         conn.commit()
+        _invalidate_tenant_caches(tenant_id)
         return tenant_dict
     finally:
-        conn.close()
+        db_pool.release(conn)
 
 
 @router.delete("/tenant/{tenant_id}/delete", status_code=status.HTTP_200_OK)
-async def delete_tenant(
+def delete_tenant(
     tenant_id: int, _: dict[str, Any] = Depends(require_admin_access)
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
+        cursor.execute("BEGIN IMMEDIATE")
         cursor.execute(
             "UPDATE devices SET tenant_id = NULL WHERE tenant_id = ?", (tenant_id,)
         )
         cursor.execute("DELETE FROM tenant_menu WHERE tenant_id = ?", (tenant_id,))
         cursor.execute("DELETE FROM tenants WHERE id = ?", (tenant_id,))
         conn.commit()
+        _invalidate_tenant_caches(tenant_id)
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        conn.close()
+        db_pool.release(conn)
     return {"message": f"Tenant with id '{tenant_id}' deleted successfully."}
 
 
 @router.post("/employee", status_code=status.HTTP_201_CREATED)
-async def create_employee(
+def create_employee(
     create_data: EmployeeCreateRequest,
     _: dict[str, Any] = Depends(require_admin_access),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
-        cursor.execute(
-            "SELECT * FROM employees WHERE employee_id = ? OR card_number = ?",
-            (create_data.employee_id, create_data.card_number),
-        )
-        if cursor.fetchone():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Employee with ID '{create_data.employee_id}' or card number '{create_data.card_number}' already exists.",
-            )
-
+        # Cek duplikat + insert dalam satu statement; employees tidak punya UNIQUE
+        # pada employee_id/card_number sehingga ON CONFLICT tidak bisa dipakai.
         cursor.execute(
             """
             INSERT INTO employees (employee_id, card_number, name, employee_group, admin, is_disabled)
-            VALUES (?, ?, ?, ?, ?, ?)
+            SELECT ?, ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM employees WHERE employee_id = ? OR card_number = ?
+            )
             """,
             (
                 create_data.employee_id,
@@ -2141,8 +2374,15 @@ async def create_employee(
                 create_data.employee_group,
                 False,
                 create_data.is_disabled,
+                create_data.employee_id,
+                create_data.card_number,
             ),
         )
+        if cursor.rowcount == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Employee with ID '{create_data.employee_id}' or card number '{create_data.card_number}' already exists.",
+            )
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -2151,9 +2391,9 @@ async def create_employee(
             detail=f"Failed to create employee: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
-    return JSONResponse(
+    return ORJSONResponse(
         content={
             "message": f"Employee with ID '{create_data.employee_id}' created successfully."
         },
@@ -2162,49 +2402,47 @@ async def create_employee(
 
 
 @router.get("/employee/{employee_id}/detail")
-async def get_employee(
+def get_employee(
     employee_id: str, _: dict[str, Any] = Depends(require_admin_access)
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM employees WHERE employee_id = ?", (employee_id,))
     employee = cursor.fetchone()
-    conn.close()
+    db_pool.release(conn)
     if not employee:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Employee with ID '{employee_id}' not found.",
         )
-    return JSONResponse(content=dict(employee))
+    return ORJSONResponse(content=dict(employee))
 
 
 @router.put("/employee/{employee_id}/update")
-async def update_employee(
+def update_employee(
     employee_id: str,
     update_data: EmployeeUpdateRequest,
     _: dict[str, Any] = Depends(require_admin_access),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT * FROM employees WHERE employee_id = ?", (employee_id,))
-        if not cursor.fetchone():
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Employee with ID '{employee_id}' not found.",
-            )
-
-        update_fields = {k: v for k, v in update_data.dict(exclude_unset=True).items()}
+        update_fields = update_data.model_dump(exclude_unset=True)
         if not update_fields:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="No fields to update"
             )
 
-        set_clause = ", ".join([f"{key} = ?" for key in update_fields.keys()])
-        query = f"UPDATE employees SET {set_clause} WHERE employee_id = ?"
-        params = list(update_fields.values()) + [employee_id]
+        query, columns = UPDATE_EMPLOYEE_SQL[frozenset(update_fields)]
+        params = [update_fields[column] for column in columns]
+        params.append(employee_id)
 
-        cursor.execute(query, tuple(params))
+        cursor.execute(query, params)
+        if cursor.rowcount == 0:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Employee with ID '{employee_id}' not found.",
+            )
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -2213,29 +2451,27 @@ async def update_employee(
             detail=f"Failed to update employee: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
-    return JSONResponse(
+    return ORJSONResponse(
         content={"message": f"Employee with ID '{employee_id}' updated successfully."},
         status_code=status.HTTP_200_OK,
     )
 
 
 @router.delete("/employee/{employee_id}/delete", status_code=status.HTTP_200_OK)
-async def delete_employee(
+def delete_employee(
     employee_id: str, _: dict[str, Any] = Depends(require_admin_access)
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT * FROM employees WHERE employee_id = ?", (employee_id,))
-        if not cursor.fetchone():
+        cursor.execute("DELETE FROM employees WHERE employee_id = ?", (employee_id,))
+        if cursor.rowcount == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Employee with ID '{employee_id}' not found.",
             )
-
-        cursor.execute("DELETE FROM employees WHERE employee_id = ?", (employee_id,))
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -2244,13 +2480,13 @@ async def delete_employee(
             detail=f"Failed to delete employee: {e}",
         )
     finally:
-        conn.close()
+        db_pool.release(conn)
 
     return {"message": f"Employee with ID '{employee_id}' deleted successfully."}
 
 
 @router.get("/transaction/report")
-async def get_transaction_reports(
+def get_transaction_reports(
     search: Optional[str] = Query(
         None,
         description="Search by employee name, tenant name, or card number (case-insensitive, partial match)",
@@ -2277,7 +2513,7 @@ async def get_transaction_reports(
     page_size: int = Query(10, ge=1, le=100, description="Number of items per page"),
     _auth: dict[str, Any] = Depends(require_admin_access),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     try:
         cursor = conn.cursor()
 
@@ -2312,9 +2548,13 @@ async def get_transaction_reports(
         if where_clauses:
             where_sql = "WHERE " + " AND ".join(where_clauses)
 
-        count_query = f"SELECT COUNT(*) FROM transactions {where_sql}"
-        cursor.execute(count_query, tuple(query_params))
-        total_items = cursor.fetchone()[0]
+        count_key = (where_sql, tuple(query_params))
+        total_items = _report_count_cache.get(count_key)
+        if total_items is None:
+            count_query = f"SELECT COUNT(*) FROM transactions {where_sql}"
+            cursor.execute(count_query, count_key[1])
+            total_items = cursor.fetchone()[0]
+            _report_count_cache.set(count_key, total_items)
         total_pages = math.ceil(total_items / page_size) if total_items > 0 else 0
 
         offset = (page - 1) * page_size
@@ -2327,10 +2567,9 @@ async def get_transaction_reports(
         """
 
         paginated_params = query_params + [page_size, offset]
+        cursor.row_factory = dict_factory
         cursor.execute(data_query, tuple(paginated_params))
-
-        columns = [column[0] for column in cursor.description]
-        transactions = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        transactions = cursor.fetchall()
 
         return {
             "data": transactions,
@@ -2348,11 +2587,45 @@ async def get_transaction_reports(
         )
     finally:
         if conn:
-            conn.close()
+            db_pool.release(conn)
+
+
+# Transaksi "orphan" = pegawainya tidak ada di daftar employees (dengan filter grup yang
+# sama). Dihitung SQLite per baris lewat NOT EXISTS, bukan diff set di Python.
+_SQL_EXPORT_IS_ORPHAN = """
+    NOT EXISTS (
+        SELECT 1 FROM employees e
+        WHERE e.employee_id = t.employee_id{group_filter}
+    )
+"""
+
+
+def _group_like_clause(column: str, groups: List[str]) -> tuple[str, list[str]]:
+    """
+    Returns `(col LIKE ? OR col LIKE ? ...)` plus params, or ("", []) tanpa filter.
+    Tetap LIKE (bukan IN) karena filter grup di UI adalah partial match.
+    """
+    if not groups:
+        return "", []
+    clause = " OR ".join(f"{column} LIKE ?" for _ in groups)
+    return f"({clause})", [f"%{group}%" for group in groups]
+
+
+def _xlsx_response(fileobj, path: Optional[str], filename: str) -> StreamingResponse:
+    """Streams workbook yang sudah jadi per 64 KiB tanpa menyalinnya ke bytes."""
+    size = fileobj.seek(0, os.SEEK_END)
+    return StreamingResponse(
+        excel_export.iter_file_chunks(fileobj, path),
+        media_type=excel_export.XLSX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(size),
+        },
+    )
 
 
 @router.get("/transaction/export")
-async def export_transactions_to_excel(
+def export_transactions_to_excel(
     date: str = Query(
         datetime.date.today().isoformat(),
         description="Date for the export (YYYY-MM-DD)",
@@ -2363,163 +2636,66 @@ async def export_transactions_to_excel(
     ),
     _auth: dict[str, Any] = Depends(require_admin_access),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     try:
         day_start, day_end = _get_local_day_bounds_from_string(date)
-        employee_group = employee_group.split()
+        # Sekali per export (dipakai tiap baris dan nama file), bukan strptime per pegawai.
+        formatted_date = datetime.date.fromisoformat(day_start[:10]).strftime("%d-%m-%Y")
+        employee_group = (employee_group or "").split()
         cursor = conn.cursor()
+        cursor.row_factory = None
 
-        query_transactions = """
-            SELECT id, card_number, employee_id, employee_name, employee_group, tenant_id, tenant_name, transaction_date
-            FROM transactions
-            WHERE transaction_date >= ? AND transaction_date < ?
-        """
-        params_transactions = [day_start, day_end]
-        if employee_group:
-            query_transactions += " AND "
-            for group in employee_group:
-                query_transactions += " employee_group LIKE ? OR"
-                params_transactions.append(f"%{group}%")    
-            query_transactions = query_transactions[:-2]
-
-        query_transactions += " ORDER BY transaction_date DESC"
-        
-        cursor.execute(query_transactions, tuple(params_transactions))
-
-        transactions = [dict(row) for row in cursor.fetchall()]
-
-        query_employee = "SELECT employee_id, name, employee_group FROM employees"
-        params_employee = []
-        if employee_group:
-            query_employee += " WHERE "
-            for group in employee_group:
-                query_employee += " employee_group LIKE ? OR"
-                params_employee.append(f"%{group}%")
-            query_employee = query_employee[:-2]
-            
-        query_employee += " ORDER BY name"
-        
-        cursor.execute(query_employee, tuple(params_employee))
-        
-        employees = [dict(row) for row in cursor.fetchall()]
-
-        wb = Workbook()
-        sheet = wb.active
-        sheet.title = "Transactions"
-
-        header_row_num = 3
-        headers = [
-            "No",
-            "Employee ID",
-            "Employee Name",
-            "Employee Group",
-            "Tenant Name",
-            "Eat",
-            "Transaction Date",
-        ]
-        for col_num, header_title in enumerate(headers, 1):
-            cell = sheet.cell(row=header_row_num, column=col_num, value=header_title)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(
-                start_color="D3D3D3", end_color="D3D3D3", fill_type="solid"
-            )
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-
-        current_row = 4
-        no = 1
-        for employee in employees:
-            transaction = next(
-                (
-                    t
-                    for t in transactions
-                    if t["employee_id"] == employee["employee_id"]
-                ),
-                None,
-            )
-
-            sheet.cell(row=current_row, column=1, value=no)
-            sheet.cell(row=current_row, column=2, value=employee["employee_id"])
-            sheet.cell(row=current_row, column=3, value=employee["name"])
-            sheet.cell(row=current_row, column=4, value=employee["employee_group"])
+        employee_filter, employee_params = _group_like_clause("e.employee_group", employee_group)
+        transaction_filter, transaction_params = _group_like_clause(
+            "t.employee_group", employee_group
+        )
+        is_orphan_sql = _SQL_EXPORT_IS_ORPHAN.format(
+            group_filter=f" AND {employee_filter}" if employee_filter else ""
+        )
 
-            formatted_date = datetime.datetime.strptime(date, "%Y-%m-%d").strftime(
-                "%d-%m-%Y"
-            )
-            if transaction:
-                sheet.cell(row=current_row, column=5, value=transaction["tenant_name"])
-                sheet.cell(row=current_row, column=6, value=1)
-                sheet.cell(row=current_row, column=7, value=formatted_date)
+        query_transactions = f"""
+            SELECT t.employee_id, t.employee_name, t.employee_group, t.tenant_name,
+                   {is_orphan_sql} AS is_orphan
+            FROM transactions t
+            WHERE t.transaction_date >= ? AND t.transaction_date < ?
+        """
+        if transaction_filter:
+            query_transactions += f" AND {transaction_filter}"
+        query_transactions += " ORDER BY t.transaction_date DESC"
+
+        # Tenant transaksi terbaru per pegawai (urutan query DESC) untuk lookup O(1);
+        # baris cursor di-unpack sebagai tuple tanpa fetchall.
+        tenant_by_employee = {}
+        orphan_transactions = []
+        for emp_id, emp_name, emp_group, tenant_name, is_orphan in cursor.execute(
+            query_transactions, (*employee_params, day_start, day_end, *transaction_params)
+        ):
+            if is_orphan:
+                orphan_transactions.append((emp_id, emp_name, emp_group, tenant_name))
             else:
-                sheet.cell(row=current_row, column=5, value="")
-                sheet.cell(row=current_row, column=6, value=0)
-                sheet.cell(row=current_row, column=7, value=formatted_date)
+                tenant_by_employee.setdefault(emp_id, tenant_name)
 
-            no += 1
-            current_row += 1
-
-        employee_ids_set = {e["employee_id"] for e in employees}
-        orphan_transactions = [
-            t for t in transactions if t["employee_id"] not in employee_ids_set
-        ]
-
-        red_fill = PatternFill(
-            start_color="FFFF0000", end_color="FFFF0000", fill_type="solid"
-        )
+        query_employee = "SELECT employee_id, name, employee_group FROM employees e"
+        if employee_filter:
+            query_employee += f" WHERE {employee_filter}"
+        query_employee += " ORDER BY name"
 
-        for transaction in orphan_transactions:
-            sheet.cell(row=current_row, column=1, value=no)
-            sheet.cell(row=current_row, column=2, value=transaction["employee_id"])
-            sheet.cell(
-                row=current_row, column=3, value=transaction.get("employee_name", "N/A")
-            )
-            sheet.cell(
-                row=current_row,
-                column=4,
-                value=transaction.get("employee_group", "N/A"),
-            )
-            sheet.cell(row=current_row, column=5, value=transaction["tenant_name"])
-            sheet.cell(row=current_row, column=6, value=1)
-            sheet.cell(row=current_row, column=7, value=date)
+        cursor.execute(query_employee, employee_params)
 
-            for col in range(1, 8):
-                sheet.cell(row=current_row, column=col).fill = red_fill
-            no += 1
-            current_row += 1
+        employees = cursor.fetchall()
 
-        thin_border = Border(
-            left=Side(style="thin"),
-            right=Side(style="thin"),
-            top=Side(style="thin"),
-            bottom=Side(style="thin"),
+        # DB dibaca di sini; serialisasi xlsx (CPU-bound) di process pool.
+        export_file, export_path = excel_export.build_workbook(
+            excel_export.build_daily_workbook,
+            employees,
+            tenant_by_employee,
+            orphan_transactions,
+            formatted_date,
+            date,
         )
 
-        for r in sheet.iter_rows(
-            min_row=header_row_num, max_row=current_row - 1, min_col=1, max_col=7
-        ):
-            for cell in r:
-                cell.border = thin_border
-
-        sheet.column_dimensions["B"].width = 15
-        sheet.column_dimensions["C"].width = 33.57
-        sheet.column_dimensions["D"].width = 15.28
-        sheet.column_dimensions["E"].width = 12.14
-        sheet.column_dimensions["F"].width = 5
-        sheet.column_dimensions["G"].width = 15
-
-        for col_letter in ["A", "B", "D", "F", "G"]:
-            for cell in sheet[col_letter]:
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-
-        virtual_workbook = io.BytesIO()
-        wb.save(virtual_workbook)
-        virtual_workbook.seek(0)
-
-        return Response(
-            content=virtual_workbook.read(),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f"attachment; filename=transactions-{formatted_date}.xlsx"
-            },
+        return _xlsx_response(
+            export_file, export_path, f"transactions-{formatted_date}.xlsx"
         )
     except Exception as e:
         print(f"Error: {e}")
@@ -2529,11 +2705,11 @@ async def export_transactions_to_excel(
         )
     finally:
         if conn:
-            conn.close()
+            db_pool.release(conn)
 
 
 @router.get("/transaction/export/monthly")
-async def export_transactions_to_excel(
+def export_transactions_to_excel(
     date: str = Query(
         datetime.date.today(),
         description="Date for the export (YYYY-MM)",
@@ -2544,178 +2720,86 @@ async def export_transactions_to_excel(
     ),
     _auth: dict[str, Any] = Depends(require_admin_access),
 ):
-    conn = get_db_connection()
+    conn = db_pool.checkout()
     try:
         cursor = conn.cursor()
+        # Tuple biasa: baris langsung di-unpack, tanpa dict/Row per transaksi.
+        cursor.row_factory = None
         date = date.split("-")
         if len(date) >= 2:
             date = date[0] + "-" + date[1]
 
-        employee_group = employee_group.split()
+        employee_group = (employee_group or "").split()
 
-        query_transactions = (
-            "SELECT * FROM transactions WHERE strftime('%Y-%m', transaction_date) = ?"
+        employee_filter, employee_params = _group_like_clause("e.employee_group", employee_group)
+        transaction_filter, transaction_params = _group_like_clause(
+            "t.employee_group", employee_group
+        )
+        is_orphan_sql = _SQL_EXPORT_IS_ORPHAN.format(
+            group_filter=f" AND {employee_filter}" if employee_filter else ""
         )
-        params_transactions = [date]
-        if employee_group:
-            query_transactions += " AND "
-        for group in employee_group:
-            query_transactions += " employee_group LIKE ? OR"
-            params_transactions.append(f"%{group}%")
-        if employee_group:
-            query_transactions = query_transactions[:-2]
-
-        cursor.execute(query_transactions, tuple(params_transactions))
-
-        transactions = [dict(row) for row in cursor.fetchall()]
-
-        query_employees = "SELECT * FROM employees"
-        params_employees = []
-        if employee_group:
-            query_employees += " WHERE "
-        for group in employee_group:
-            query_employees += " employee_group LIKE ? OR"
-            params_employees.append(f"%{group}%")
-        if employee_group:
-            query_employees = query_employees[:-2]
-        query_employees += " ORDER BY name"
-        cursor.execute(query_employees, tuple(params_employees))
-        employees = [dict(row) for row in cursor.fetchall()]
-        employee_data = {}
-        for emp in employees:
-            employee_data[emp["employee_id"]] = {
-                "details": emp,
-                "eats_by_day": defaultdict(str),
-            }
-
-        for t in transactions:
-            emp_id = t["employee_id"]
-            if emp_id in employee_data:
-                day = datetime.datetime.fromisoformat(t["transaction_date"]).day
-                employee_data[emp_id]["eats_by_day"][day] = t["tenant_name"]
-
-        wb = Workbook()
-        sheet = wb.active
-        sheet.title = f"Transactions {date}"
 
         year, month = map(int, date.split("-"))
+        month_start, month_end = _get_month_bounds(year, month)
         _, num_days = calendar.monthrange(year, month)
 
-        header_row_num = 3
-        static_headers = ["No", "Employee ID", "Employee Name", "Employee Group"]
-        date_headers = [str(day) for day in range(1, num_days + 1)]
-        all_headers = static_headers + date_headers
-
-        for col_num, header_title in enumerate(all_headers, 1):
-            cell = sheet.cell(row=header_row_num, column=col_num, value=header_title)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(
-                start_color="D3D3D3", end_color="D3D3D3", fill_type="solid"
-            )
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-
-        current_row = 4
-        no = 1
-        for emp in employees:
-            emp_id = emp["employee_id"]
-            data = employee_data[emp_id]
-
-            sheet.cell(row=current_row, column=1, value=no)
-            sheet.cell(row=current_row, column=2, value=data["details"]["employee_id"])
-            sheet.cell(row=current_row, column=3, value=data["details"]["name"])
-            sheet.cell(
-                row=current_row, column=4, value=data["details"]["employee_group"]
-            )
-
-            for day in range(1, num_days + 1):
-                eat_value = data["eats_by_day"].get(day, '')
-                sheet.cell(
-                    row=current_row, column=len(static_headers) + day, value=eat_value
-                )
-
-            current_row += 1
-            no += 1
-
-        employee_ids_set = {e["employee_id"] for e in employees}
-        orphan_transactions = [
-            t for t in transactions if t["employee_id"] not in employee_ids_set
-        ]
-
+        # Pegawai + transaksinya bulan ini dalam satu LEFT JOIN, urut per pegawai; baris
+        # pegawai selesai ketika rowid berganti (employee_id di tabel tidak unik).
+        query_employees = f"""
+            SELECT e.rowid, e.employee_id, e.name, e.employee_group,
+                   t.tenant_name, t.transaction_date
+            FROM employees e
+            LEFT JOIN transactions t
+                ON t.employee_id = e.employee_id
+                AND t.transaction_date >= ? AND t.transaction_date < ?
+                {f"AND {transaction_filter}" if transaction_filter else ""}
+            {f"WHERE {employee_filter}" if employee_filter else ""}
+            ORDER BY e.name, e.rowid
+        """
+        employee_rows = []
+        current_rowid = None
+        eats_by_day = None
+        for rowid, emp_id, emp_name, emp_group, tenant_name, transaction_date in cursor.execute(
+            query_employees,
+            (month_start, month_end, *transaction_params, *employee_params),
+        ):
+            if rowid != current_rowid:
+                current_rowid = rowid
+                # List per hari (index 0 tidak dipakai) agar baris Excel cukup di-slice.
+                eats_by_day = [""] * (num_days + 1)
+                employee_rows.append((emp_id, emp_name, emp_group, eats_by_day))
+            if transaction_date is not None:
+                # Hari diambil langsung dari "YYYY-MM-DD ...".
+                eats_by_day[int(transaction_date[8:10])] = tenant_name
+
+        # Transaksi yang pegawainya tidak ada di daftar di atas (orphan).
+        query_orphans = f"""
+            SELECT t.employee_id, t.employee_name, t.employee_group, t.tenant_name,
+                   t.transaction_date
+            FROM transactions t
+            WHERE t.transaction_date >= ? AND t.transaction_date < ?
+                {f"AND {transaction_filter}" if transaction_filter else ""}
+                AND {is_orphan_sql}
+        """
         orphan_data = {}
-        for t in orphan_transactions:
-            emp_id = t["employee_id"]
-            if emp_id not in orphan_data:
-                orphan_data[emp_id] = {
-                    "details": t,
-                    "eats_by_day": defaultdict(str),
-                }
-            day = datetime.datetime.fromisoformat(t["transaction_date"]).day
-            orphan_data[emp_id]["eats_by_day"][day] = t["tenant_name"]
+        for emp_id, emp_name, emp_group, tenant_name, transaction_date in cursor.execute(
+            query_orphans,
+            (month_start, month_end, *transaction_params, *employee_params),
+        ):
+            orphan = orphan_data.get(emp_id)
+            if orphan is None:
+                orphan = orphan_data[emp_id] = (emp_name, emp_group, [0] * (num_days + 1))
+            orphan[2][int(transaction_date[8:10])] = tenant_name
 
-        red_fill = PatternFill(
-            start_color="FFFF0000", end_color="FFFF0000", fill_type="solid"
+        export_file, export_path = excel_export.build_workbook(
+            excel_export.build_monthly_workbook,
+            date,
+            num_days,
+            employee_rows,
+            orphan_data,
         )
 
-        for emp_id, data in orphan_data.items():
-
-            sheet.cell(row=current_row, column=1, value=no)
-            sheet.cell(row=current_row, column=2, value=emp_id)
-            sheet.cell(
-                row=current_row,
-                column=3,
-                value=data["details"].get("employee_name", "N/A"),
-            )
-            sheet.cell(
-                row=current_row,
-                column=4,
-                value=data["details"].get("employee_group", "N/A"),
-            )
-
-            for day in range(1, num_days + 1):
-                eat_value = data["eats_by_day"].get(day, 0)
-                sheet.cell(
-                    row=current_row, column=len(static_headers) + day, value=eat_value
-                )
-
-            for col in range(1, len(all_headers) + 1):
-                sheet.cell(row=current_row, column=col).fill = red_fill
-
-            current_row += 1
-            no += 1
-
-        thin_border = Border(
-            left=Side(style="thin"),
-            right=Side(style="thin"),
-            top=Side(style="thin"),
-            bottom=Side(style="thin"),
-        )
-        for r in sheet.iter_rows(
-            min_row=header_row_num,
-            max_row=current_row - 1,
-            min_col=1,
-            max_col=len(all_headers),
-        ):
-            for cell in r:
-                cell.border = thin_border
-
-        sheet.column_dimensions["B"].width = 15
-        sheet.column_dimensions["C"].width = 33.57
-        sheet.column_dimensions["D"].width = 15.28
-
-        for i in range(len(static_headers) + 1, len(all_headers) + 1):
-            col_letter = get_column_letter(i)
-            sheet.column_dimensions[col_letter].width = 4
-        virtual_workbook = io.BytesIO()
-        wb.save(virtual_workbook)
-        virtual_workbook.seek(0)
-
-        return Response(
-            content=virtual_workbook.read(),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f"attachment; filename=transactions-{date}.xlsx"
-            },
-        )
+        return _xlsx_response(export_file, export_path, f"transactions-{date}.xlsx")
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(
@@ -2724,5 +2808,5 @@ async def export_transactions_to_excel(
         )
     finally:
         if conn:
-            conn.close()
+            db_pool.release(conn)
             
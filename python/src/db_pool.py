@@ -0,0 +1,222 @@
+import asyncio
+import concurrent.futures
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from .sqlite_database import ensure_planner_stats, open_connection
+
+DEFAULT_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# sqlite3 menyimpan prepared statement per koneksi (LRU, key = teks SQL).
+# Karena koneksi pool berumur panjang, query yang sama tidak di-prepare ulang tiap request.
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE", "512"))
+# Page cache per koneksi dalam KiB (dikirim negatif ke PRAGMA cache_size)
+# dan ukuran mmap; koneksi pool berumur panjang sehingga cache tetap hangat antar request.
+CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", "65536"))
+MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+T = TypeVar("T")
+
+# SELECT jalur panas yang dijalankan sekali (dengan parameter dummy) saat koneksi
+# dibuka, sehingga sudah ter-prepare di statement cache sebelum request pertama.
+_hot_statements: List[Tuple[str, Tuple[Any, ...]]] = []
+
+
+def register_hot_statements(*statements: Tuple[str, Tuple[Any, ...]]) -> None:
+    """Daftarkan (sql, params) read-only yang murah; teks SQL harus identik dengan pemanggil."""
+    _hot_statements.extend(statements)
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that remembers which pool it belongs to."""
+
+    pool: Optional["ConnectionPool"] = None
+
+
+class ConnectionPool:
+    """
+    Pool of SQLite connections for one mode ("default" / "tap" / "read").
+    Connections are opened lazily and configured once (WAL, PRAGMAs), so
+    handlers no longer pay a file open + PRAGMA setup on every request.
+    At most `size` idle connections are kept; a burst beyond that opens extra
+    connections (like SQLAlchemy's max_overflow) instead of blocking, because
+    some handlers call helpers that check out a second connection.
+    """
+
+    def __init__(self, mode: str, size: int = DEFAULT_POOL_SIZE):
+        self.mode = mode
+        self.size = max(1, size)
+        self._idle: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue(self.size)
+        self._closed = False
+        self._in_use = 0
+        self._in_use_lock = threading.Lock()
+
+    def _connect(self) -> PooledConnection:
+        conn = open_connection(
+            self.mode,
+            check_same_thread=False,
+            factory=PooledConnection,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.execute("PRAGMA temp_store = MEMORY;")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB};")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE};")
+        for sql, params in _hot_statements:
+            try:
+                conn.execute(sql, params).fetchall()
+            except sqlite3.Error:
+                # Mis. tabel belum dibuat; statement akan di-prepare saat pertama dipakai.
+                pass
+        conn.pool = self
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        with self._in_use_lock:
+            self._in_use += 1
+        return conn
+
+    def release(self, conn: PooledConnection) -> None:
+        with self._in_use_lock:
+            self._in_use -= 1
+        try:
+            # Transaksi yang tertinggal (mis. karena exception) jangan ikut ke request berikutnya.
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            conn.close()
+            return
+        if self._closed:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Jumlah koneksi yang sedang dipinjam dan yang menganggur di pool."""
+        return {
+            "mode": self.mode,
+            "size": self.size,
+            "in_use": self._in_use,
+            "idle": self._idle.qsize(),
+        }
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(mode: str = "default") -> ConnectionPool:
+    mode = (mode or "default").lower()
+    pool = _pools.get(mode)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(mode)
+            if pool is None:
+                pool = _pools[mode] = ConnectionPool(mode)
+    return pool
+
+
+def checkout(mode: str = "default") -> PooledConnection:
+    """Ambil koneksi dari pool; wajib dikembalikan lewat `release()`."""
+    return get_pool(mode).acquire()
+
+
+def release(conn: PooledConnection) -> None:
+    conn.pool.release(conn)
+
+
+def releaser(conn: PooledConnection) -> Callable[[], None]:
+    """
+    Callable yang mengembalikan `conn` ke pool tepat sekali untuk checkout ini,
+    aman dipanggil dari beberapa jalur cleanup (mis. generator stream dan response).
+    """
+    lock = threading.Lock()
+    released = False
+
+    def release_once() -> None:
+        nonlocal released
+        with lock:
+            if released:
+                return
+            released = True
+        release(conn)
+
+    return release_once
+
+
+@contextmanager
+def get_conn(mode: str = "default") -> Iterator[PooledConnection]:
+    conn = checkout(mode)
+    try:
+        yield conn
+    finally:
+        release(conn)
+
+
+def init_pool() -> None:
+    """Dipanggil dari lifespan: buka satu koneksi per mode agar request pertama tidak menunggu."""
+    for mode in ("default", "tap", "read"):
+        release(checkout(mode))
+    with get_conn() as conn:
+        ensure_planner_stats(conn)
+
+
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=DEFAULT_POOL_SIZE, thread_name_prefix="db"
+            )
+        return _executor
+
+
+async def run(func: Callable[..., T], *args: Any) -> T:
+    """
+    Untuk handler async: jalankan kerja SQLite blocking di executor khusus DB yang
+    ukurannya sama dengan pool (DB_POOL_SIZE), jadi tidak ada thread yang menunggu
+    koneksi yang tidak ada dan threadpool anyio tetap bebas untuk handler sync lain.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), func, *args)
+
+
+def pool_stats() -> List[Dict[str, Any]]:
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def close_pool() -> None:
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
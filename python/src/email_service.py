@@ -1,5 +1,7 @@
 import datetime
+import functools
 import os
+import re
 import smtplib
 from email.message import EmailMessage
 from email.utils import formataddr
@@ -33,18 +35,22 @@ def _build_menu_lines(order: Dict[str, Any]) -> List[str]:
     return lines or ["- (detail menu tidak tersedia)"]
 
 
+_TENANT_WHATSAPP = {
+    "yanti": "6285880259653",
+    "rima": "6285718899709",
+}
+_TENANT_WHATSAPP_PATTERN = re.compile(
+    "|".join(re.escape(key) for key in _TENANT_WHATSAPP), re.IGNORECASE
+)
+
+
+@functools.lru_cache(maxsize=256)
 def _get_whatsapp_number_for_tenant(tenant_name: str) -> Optional[str]:
-    tenant_name = (tenant_name or "").lower()
-    mapping = {
-        "yanti": "6285880259653",
-        "rima": "6285718899709",
-    }
-    for key, value in mapping.items():
-        if key in tenant_name:
-            return value
-    return None
+    match = _TENANT_WHATSAPP_PATTERN.search(tenant_name or "")
+    return _TENANT_WHATSAPP[match.group(0).lower()] if match else None
 
 
+@functools.lru_cache(maxsize=256)
 def _get_tenant_prefix(tenant_name: str) -> str:
     name = (tenant_name or "").lower()
     if "yanti" in name:
@@ -162,11 +168,33 @@ def _build_whatsapp_url(order: Dict[str, Any], employee_name: str, employee_id:
     return f"https://api.whatsapp.com/send?phone={wa_number}&text={quote_plus(message)}"
 
 
+def open_smtp_connection() -> smtplib.SMTP:
+    """Buka koneksi SMTP (EHLO, STARTTLS, login sesuai konfigurasi) yang siap dipakai kirim."""
+    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
+    try:
+        server.ehlo()
+        if SMTP_USE_TLS:
+            server.starttls()
+            server.ehlo()
+        if SMTP_USE_AUTH and SMTP_USERNAME and SMTP_PASSWORD:
+            server.login(SMTP_USERNAME, SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
 def send_order_confirmation(
-    to_email: Optional[str], order: Dict[str, Any], *, recipient: str = "employee"
+    to_email: Optional[str],
+    order: Dict[str, Any],
+    *,
+    recipient: str = "employee",
+    smtp: Optional[smtplib.SMTP] = None,
 ) -> None:
     """
     Kirim email ringkasan pre-order ke karyawan sesuai desain Cawang Canteen.
+    `smtp` = koneksi dari open_smtp_connection() yang dipakai ulang (mis. oleh worker
+    mail_queue); tanpa itu dibuka koneksi baru khusus untuk email ini.
     """
     if not to_email:
         return
@@ -306,14 +334,11 @@ Tenant: {tenant_name}
     msg.add_alternative(html_body, subtype="html")
 
     try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.ehlo()
-            if SMTP_USE_TLS:
-                server.starttls()
-                server.ehlo()
-            if SMTP_USE_AUTH and SMTP_USERNAME and SMTP_PASSWORD:
-                server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.send_message(msg)
+        if smtp is not None:
+            smtp.send_message(msg)
+        else:
+            with open_smtp_connection() as server:
+                server.send_message(msg)
     except Exception as exc:
         print(f"Failed to send email: {exc!r}")
         raise
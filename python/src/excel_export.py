@@ -0,0 +1,240 @@
+import concurrent.futures
+import multiprocessing
+import os
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import xlsxwriter
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Workbook inline ditulis ke SpooledTemporaryFile: di RAM sampai batas ini, lalu pindah ke disk.
+EXPORT_SPOOL_MAX_SIZE = 16 * 1024 * 1024
+EXPORT_CHUNK_SIZE = 64 * 1024
+# Serialisasi xlsx memegang GIL; dengan process pool beberapa export bisa jalan paralel
+# di core berbeda. EXPORT_WORKERS=0 = build di thread handler seperti sebelumnya.
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _new_export_workbook(target):
+    """
+    Workbook xlsxwriter dalam mode constant_memory: baris ditulis langsung ke file
+    sementara (harus berurutan), bukan disimpan sebagai objek Cell seperti openpyxl.
+    Returns (workbook, formats) dengan format yang dipakai bersama oleh exporter.
+    """
+    wb = xlsxwriter.Workbook(target, {"constant_memory": True})
+    center = {"align": "center", "valign": "vcenter"}
+    orphan = {"border": 1, "bg_color": "#FF0000", "pattern": 1}
+    formats = {
+        "header": wb.add_format(
+            {"bold": True, "bg_color": "#D3D3D3", "pattern": 1, "border": 1, **center}
+        ),
+        "cell": wb.add_format({"border": 1}),
+        "center": wb.add_format({"border": 1, **center}),
+        "orphan": wb.add_format(orphan),
+        "orphan_center": wb.add_format({**orphan, **center}),
+    }
+    return wb, formats
+
+
+def build_daily_workbook(
+    target,
+    employees: Sequence[Tuple[Any, Any, Any]],
+    tenant_by_employee: Dict[Any, Any],
+    orphan_transactions: Sequence[Tuple[Any, Any, Any, Any]],
+    formatted_date: str,
+    date_text: str,
+) -> None:
+    """Sheet harian: satu baris per pegawai, lalu transaksi orphan berwarna merah."""
+    wb, fmt = _new_export_workbook(target)
+    sheet = wb.add_worksheet("Transactions")
+
+    header_row = 2  # baris ke-3 di Excel
+    headers = [
+        "No",
+        "Employee ID",
+        "Employee Name",
+        "Employee Group",
+        "Tenant Name",
+        "Eat",
+        "Transaction Date",
+    ]
+    # Format per kolom dipasang sekali lewat set_column (kolom A, B, D, F, G rata
+    # tengah); baris pegawai ditulis dengan write_row tanpa format per cell.
+    # Harus sebelum baris data karena mode constant_memory menulis baris berurutan.
+    column_layout = (
+        (None, "center"),
+        (15, "center"),
+        (33.57, "cell"),
+        (15.28, "center"),
+        (12.14, "cell"),
+        (5, "center"),
+        (15, "center"),
+    )
+    for col, (width, name) in enumerate(column_layout):
+        sheet.set_column(col, col, width, fmt[name])
+    orphan_formats = [
+        fmt["orphan_center"] if name == "center" else fmt["orphan"]
+        for _, name in column_layout
+    ]
+    sheet.write_row(header_row, 0, headers, fmt["header"])
+
+    current_row = header_row + 1
+    no = 1
+    for emp_id, emp_name, emp_group in employees:
+        has_transaction = emp_id in tenant_by_employee
+        values = [
+            no,
+            emp_id,
+            emp_name,
+            emp_group,
+            tenant_by_employee[emp_id] if has_transaction else "",
+            1 if has_transaction else 0,
+            formatted_date,
+        ]
+        sheet.write_row(current_row, 0, values)
+        if not has_transaction:
+            # Cell kosong tanpa format dilewati xlsxwriter; tulis blank agar border tetap ada.
+            sheet.write_blank(current_row, 4, None, fmt["cell"])
+
+        no += 1
+        current_row += 1
+
+    for emp_id, emp_name, emp_group, tenant_name in orphan_transactions:
+        values = [no, emp_id, emp_name, emp_group, tenant_name, 1, date_text]
+        for col, (value, cell_format) in enumerate(zip(values, orphan_formats)):
+            sheet.write(current_row, col, value, cell_format)
+        no += 1
+        current_row += 1
+
+    wb.close()
+
+
+def build_monthly_workbook(
+    target,
+    month_text: str,
+    num_days: int,
+    employee_rows: Sequence[Tuple[Any, Any, Any, List[Any]]],
+    orphan_data: Dict[Any, Tuple[Any, Any, List[Any]]],
+) -> None:
+    """
+    Sheet bulanan: kolom per tanggal berisi nama tenant tempat pegawai makan.
+    `employee_rows` berisi (employee_id, name, group, eats_by_day) dengan index 0 tidak dipakai.
+    """
+    wb, fmt = _new_export_workbook(target)
+    sheet = wb.add_worksheet(f"Transactions {month_text}")
+
+    header_row = 2  # baris ke-3 di Excel
+    static_headers = ["No", "Employee ID", "Employee Name", "Employee Group"]
+    date_headers = [str(day) for day in range(1, num_days + 1)]
+    all_headers = static_headers + date_headers
+    sheet.write_row(header_row, 0, all_headers, fmt["header"])
+
+    current_row = header_row + 1
+    no = 1
+    for emp_id, emp_name, emp_group, eats_by_day in employee_rows:
+        # Satu write_row per baris dengan satu format bersama untuk seluruh baris.
+        sheet.write_row(
+            current_row,
+            0,
+            [no, emp_id, emp_name, emp_group, *eats_by_day[1:]],
+            fmt["cell"],
+        )
+
+        current_row += 1
+        no += 1
+
+    for emp_id, (emp_name, emp_group, eats_by_day) in orphan_data.items():
+        sheet.write_row(
+            current_row,
+            0,
+            [no, emp_id, emp_name, emp_group, *eats_by_day[1:]],
+            fmt["orphan"],
+        )
+
+        current_row += 1
+        no += 1
+
+    sheet.set_column(1, 1, 15)
+    sheet.set_column(2, 2, 33.57)
+    sheet.set_column(3, 3, 15.28)
+    sheet.set_column(len(static_headers), len(all_headers) - 1, 4)
+
+    wb.close()
+
+
+def _noop() -> None:
+    return None
+
+
+def _get_pool() -> concurrent.futures.ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # fork di POSIX (tanpa import ulang modul __main__), spawn di Windows.
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=EXPORT_WORKERS, mp_context=context
+            )
+        return _pool
+
+
+def start_pool() -> None:
+    """
+    Dipanggil paling awal di lifespan: dengan context fork semua worker langsung
+    dibuat pada submit pertama, jadi fork terjadi sebelum threadpool handler ada.
+    """
+    if EXPORT_WORKERS > 0:
+        _get_pool().submit(_noop).result()
+
+
+def shutdown_pool() -> None:
+    """Dipanggil dari lifespan saat shutdown."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def build_workbook(builder: Callable[..., None], *args: Any) -> Tuple[Any, Optional[str]]:
+    """
+    Menjalankan `builder(target, *args)` dan mengembalikan (file terbuka untuk dibaca,
+    path file sementara atau None). Dengan EXPORT_WORKERS > 0 builder berjalan di
+    process pool dan menulis ke file sementara di disk; path-nya dihapus setelah
+    response selesai di-stream.
+    """
+    if EXPORT_WORKERS <= 0:
+        fileobj = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE)
+        builder(fileobj, *args)
+        return fileobj, None
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        _get_pool().submit(builder, path, *args).result()
+        return open(path, "rb"), path
+    except concurrent.futures.process.BrokenProcessPool:
+        # Worker mati (mis. OOM): buang pool agar export berikutnya membuat pool baru.
+        shutdown_pool()
+        os.remove(path)
+        raise
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+def iter_file_chunks(fileobj, path: Optional[str] = None, chunk_size: int = EXPORT_CHUNK_SIZE):
+    try:
+        fileobj.seek(0)
+        while chunk := fileobj.read(chunk_size):
+            yield chunk
+    finally:
+        fileobj.close()
+        if path is not None:
+            os.remove(path)
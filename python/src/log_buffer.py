@@ -0,0 +1,61 @@
+import asyncio
+import os
+import sys
+from collections import deque
+from typing import Deque, Optional
+
+
+class LogBuffer:
+    """
+    Log baris-per-baris untuk jalur panas (/tap) tanpa print sinkron di thread handler.
+
+    `write()` hanya `deque.append` (aman dari thread mana pun). Satu task di event loop
+    utama menulis semua baris yang terkumpul ke stdout setiap `flush_interval_ms`.
+    Selama writer belum jalan (mis. skrip tanpa lifespan) baris langsung di-print.
+    """
+
+    def __init__(self, flush_interval_ms: float = 50.0):
+        self.flush_interval = max(1.0, flush_interval_ms) / 1000
+        self._lines: Deque[str] = deque()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def write(self, line: str) -> None:
+        if self.running:
+            self._lines.append(line)
+        else:
+            print(line)
+
+    def flush(self) -> None:
+        lines = self._lines
+        if not lines:
+            return
+        chunk = []
+        while lines:
+            chunk.append(lines.popleft())
+        sys.stdout.write("\n".join(chunk) + "\n")
+        sys.stdout.flush()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+
+tap_log = LogBuffer(flush_interval_ms=float(os.getenv("TAP_LOG_FLUSH_MS", "50")))
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import os
+import smtplib
+import sqlite3
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from . import db_pool
+from .email_service import open_smtp_connection, send_order_confirmation
+
+
+def ensure_pending_emails_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pending_emails (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            to_email TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TEXT NOT NULL DEFAULT (datetime('now','localtime'))
+        )
+        """
+    )
+    conn.commit()
+
+
+class MailQueue:
+    """
+    Antrian email konfirmasi pre-order yang dikerjakan worker di event loop utama.
+
+    `enqueue()` (dipanggil dari handler threadpool) menyimpan email ke tabel
+    `pending_emails` lalu menaruh id-nya ke asyncio.Queue. Worker mengirim via SMTP
+    di thread terpisah dan menghapus row setelah berhasil. Email yang gagal
+    dimasukkan lagi ke antrian dengan backoff eksponensial (`retry_base_seconds`,
+    maksimal `retry_max_seconds`) sampai `max_attempts`; row yang belum terkirim
+    saat shutdown dikirim ulang saat `start()` berikutnya.
+
+    Tiap worker memakai ulang satu koneksi SMTP selama antrian masih terisi, jadi
+    burst pre-order tidak membayar connect + STARTTLS + login per email. Bila koneksi
+    yang dipakai ulang gagal (mis. sudah diputus server), email langsung dicoba sekali
+    lagi lewat koneksi baru. Koneksi ditutup setelah `smtp_idle_seconds` tanpa email.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        smtp_idle_seconds: float = 30.0,
+        max_attempts: int = 5,
+        retry_base_seconds: float = 30.0,
+        retry_max_seconds: float = 1800.0,
+    ):
+        self.workers = max(1, workers)
+        self.smtp_idle_seconds = max(0.0, smtp_idle_seconds)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = max(0.0, retry_base_seconds)
+        self.retry_max_seconds = max(self.retry_base_seconds, retry_max_seconds)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retry_handles: Set[asyncio.TimerHandle] = set()
+        self._table_ready = False
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        pending_ids = await asyncio.to_thread(self._load_pending_ids)
+        for item_id in pending_ids:
+            self._queue.put_nowait(item_id)
+        self._tasks = [
+            asyncio.create_task(self._run()) for _ in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        # Retry yang belum jatuh tempo tetap ada di pending_emails untuk start() berikutnya.
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop = None
+
+    def enqueue(self, to_email: Optional[str], order: Dict[str, Any], *, recipient: str) -> None:
+        """Thread-safe: simpan email ke pending_emails dan jadwalkan pengirimannya."""
+        if not to_email:
+            return
+        with db_pool.get_conn() as conn:
+            if not self._table_ready:
+                ensure_pending_emails_table(conn)
+                self._table_ready = True
+            cursor = conn.execute(
+                "INSERT INTO pending_emails (to_email, recipient, payload) VALUES (?, ?, ?)",
+                (to_email, recipient, json.dumps(order)),
+            )
+            conn.commit()
+            item_id = cursor.lastrowid
+        if self._loop is not None and self.running:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item_id)
+
+    def _load_pending_ids(self) -> List[int]:
+        with db_pool.get_conn() as conn:
+            ensure_pending_emails_table(conn)
+            self._table_ready = True
+            rows = conn.execute(
+                "SELECT id FROM pending_emails WHERE attempts < ? ORDER BY id",
+                (self.max_attempts,),
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def _deliver(
+        self, item_id: int, smtp: Optional[smtplib.SMTP]
+    ) -> Tuple[Optional[smtplib.SMTP], Optional[int]]:
+        """
+        Kirim satu email. Returns (koneksi SMTP yang boleh dipakai ulang atau None,
+        jumlah attempts bila gagal atau None bila terkirim).
+        """
+        with db_pool.get_conn() as conn:
+            row = conn.execute(
+                "SELECT to_email, recipient, payload FROM pending_emails WHERE id = ?",
+                (item_id,),
+            ).fetchone()
+        if row is None:
+            return smtp, None
+        order = json.loads(row["payload"])
+        try:
+            smtp = self._send(row, order, smtp)
+        except Exception as exc:
+            with db_pool.get_conn() as conn:
+                attempts = conn.execute(
+                    "UPDATE pending_emails SET attempts = attempts + 1, last_error = ? "
+                    "WHERE id = ? RETURNING attempts",
+                    (repr(exc), item_id),
+                ).fetchone()[0]
+                conn.commit()
+            return None, attempts
+        with db_pool.get_conn() as conn:
+            conn.execute("DELETE FROM pending_emails WHERE id = ?", (item_id,))
+            conn.commit()
+        return smtp, None
+
+    @staticmethod
+    def _send(row, order: Dict[str, Any], smtp: Optional[smtplib.SMTP]) -> smtplib.SMTP:
+        """Kirim lewat `smtp`; koneksi reuse yang gagal diganti koneksi baru dan dicoba sekali lagi."""
+        if smtp is not None:
+            try:
+                send_order_confirmation(
+                    row["to_email"], order, recipient=row["recipient"], smtp=smtp
+                )
+                return smtp
+            except Exception:
+                _close_smtp(smtp)
+        smtp = open_smtp_connection()
+        try:
+            send_order_confirmation(
+                row["to_email"], order, recipient=row["recipient"], smtp=smtp
+            )
+        except Exception:
+            _close_smtp(smtp)
+            raise
+        return smtp
+
+    def _schedule_retry(self, item_id: int, attempts: int) -> None:
+        if attempts >= self.max_attempts:
+            print(
+                f"[mail_queue] Email {item_id} gagal {attempts}x, tidak dicoba lagi "
+                "(row tetap di pending_emails)."
+            )
+            return
+        delay = min(
+            self.retry_max_seconds, self.retry_base_seconds * (2 ** (attempts - 1))
+        )
+        handle: Optional[asyncio.TimerHandle] = None
+
+        def requeue() -> None:
+            self._retry_handles.discard(handle)
+            if self.running:
+                self._queue.put_nowait(item_id)
+
+        handle = self._loop.call_later(delay, requeue)
+        self._retry_handles.add(handle)
+
+    async def _run(self) -> None:
+        smtp: Optional[smtplib.SMTP] = None
+        try:
+            while True:
+                if smtp is None:
+                    item_id = await self._queue.get()
+                else:
+                    try:
+                        item_id = await asyncio.wait_for(
+                            self._queue.get(), self.smtp_idle_seconds
+                        )
+                    except asyncio.TimeoutError:
+                        await asyncio.to_thread(_close_smtp, smtp)
+                        smtp = None
+                        continue
+                try:
+                    smtp, failed_attempts = await asyncio.to_thread(
+                        self._deliver, item_id, smtp
+                    )
+                except Exception as exc:
+                    print(f"[mail_queue] Gagal memproses email {item_id}: {exc!r}")
+                    continue
+                if failed_attempts is not None:
+                    self._schedule_retry(item_id, failed_attempts)
+        finally:
+            _close_smtp(smtp)
+
+
+def _close_smtp(smtp: Optional[smtplib.SMTP]) -> None:
+    if smtp is None:
+        return
+    try:
+        smtp.quit()
+    except Exception:
+        smtp.close()
+
+
+mail_queue = MailQueue(
+    workers=int(os.getenv("MAIL_WORKERS", "2")),
+    smtp_idle_seconds=float(os.getenv("MAIL_SMTP_IDLE_SECONDS", "30")),
+    max_attempts=int(os.getenv("MAIL_MAX_ATTEMPTS", "5")),
+    retry_base_seconds=float(os.getenv("MAIL_RETRY_BASE_SECONDS", "30")),
+)
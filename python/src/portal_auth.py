@@ -8,7 +8,7 @@ try:
 except ModuleNotFoundError:
     pyodbc = None
 
-from .sqlite_database import get_db_connection
+from . import db_pool
 
 load_dotenv()
 
@@ -112,9 +112,8 @@ def verify_portal_token(employee_id: str, portal_token: str) -> Optional[Dict[st
         print("[DEBUG AUTH] Verifikasi GAGAL di tahap Database Portal.")
         return None
 
-    # Step 2: Ambil detail User dari Database Lokal (SQLite)
-    conn = get_db_connection()
-    try:
+    # Step 2: Ambil detail User dari Database Lokal (SQLite), koneksi dari pool
+    with db_pool.get_conn() as conn:
         cursor = conn.cursor()
         print(f"[DEBUG LOCAL] Mencari data user {employee_id} di SQLite lokal...")
         cursor.execute(
@@ -137,8 +136,6 @@ def verify_portal_token(employee_id: str, portal_token: str) -> Optional[Dict[st
             "name": row["name"],
             "email": row["email"],
         }
-    finally:
-        conn.close()
 
 
 __all__ = ["verify_portal_token"]
@@ -1,33 +1,55 @@
 import json
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
 CONTROL_FILE = os.getenv("PORTAL_CONTROL_FILE", "data/portal_control.json")
 
+_resolved_path: Optional[Path] = None
+# (st_mtime_ns, st_size) file terakhir yang dibaca beserta nilai override-nya.
+_last_read: Optional[Tuple[Tuple[int, int], Optional[str]]] = None
+
 
 def _control_path() -> Path:
-    path = Path(CONTROL_FILE)
-    if not path.is_absolute():
-        base = Path(__file__).resolve().parents[1]
-        path = base / path
-    return path
+    global _resolved_path
+    if _resolved_path is None:
+        path = Path(CONTROL_FILE)
+        if not path.is_absolute():
+            base = Path(__file__).resolve().parents[1]
+            path = base / path
+        _resolved_path = path
+    return _resolved_path
 
 
 def read_override() -> Optional[str]:
+    """Satu os.stat per panggilan; file hanya dibuka ulang bila mtime/ukurannya berubah."""
+    global _last_read
     path = _control_path()
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _last_read = None
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    last = _last_read
+    if last is not None and last[0] == key:
+        return last[1]
     try:
         with path.open("r", encoding="utf-8") as f:
             data = json.load(f)
-        return data.get("override")
+        value = data.get("override")
     except FileNotFoundError:
         return None
     except json.JSONDecodeError:
         return None
+    _last_read = (key, value)
+    return value
 
 
 def set_override(mode: Optional[str]) -> None:
+    global _last_read
     path = _control_path()
+    _last_read = None
     if not mode or mode == "normal":
         if path.exists():
             path.unlink()
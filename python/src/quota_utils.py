@@ -8,13 +8,9 @@ def evaluate_tenant_quota_for_today(conn, target_tenant_id: int) -> Dict[str, An
     diperbolehkan menerima order saat ini.
     """
     today = datetime.datetime.now().date()
-    day_start = datetime.datetime.combine(today, datetime.time.min).strftime(
-        "%Y-%m-%d %H:%M:%S"
-    )
-    day_end = (
-        datetime.datetime.combine(today, datetime.time.min)
-        + datetime.timedelta(days=1)
-    ).strftime("%Y-%m-%d %H:%M:%S")
+    # Format sama dengan transaction_date ("YYYY-MM-DD HH:MM:SS"), tanpa strftime.
+    day_start = f"{today.isoformat()} 00:00:00"
+    day_end = f"{(today + datetime.timedelta(days=1)).isoformat()} 00:00:00"
     cursor = conn.cursor()
     cursor.execute(
         """
@@ -0,0 +1,21 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+
+def dumps_json(content: Any) -> bytes:
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse yang memakai orjson untuk serialisasi (lebih cepat dari stdlib json)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+class RawJSONResponse(Response):
+    """Body JSON yang sudah di-encode (mis. disimpan di cache), dikirim apa adanya."""
+
+    media_type = "application/json"
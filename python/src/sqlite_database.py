@@ -13,13 +13,30 @@ SAMPLE_EMPLOYEE = {
 }
 
 
-def get_db_connection(mode: str = "default"):
-    """Establishes a connection to the SQLite database."""
+def get_db_file() -> str:
+    """Returns the SQLite database path, creating its directory if needed."""
     db_file = os.getenv("DATABASE_FILE", "data/canteen.db")
     db_dir = os.path.dirname(db_file)
     if db_dir:
         os.makedirs(db_dir, exist_ok=True)
+    return db_file
+
+
+# journal_mode=WAL tersimpan di file DB, cukup diset sekali per file per proses;
+# synchronous/busy_timeout berlaku per koneksi dan tetap diset di setiap open.
+_wal_enabled_files = set()
+# Checkpoint otomatis tiap N halaman WAL dan batas ukuran file -wal setelah checkpoint,
+# supaya WAL tidak terus membesar di hari sibuk (dibaca ulang oleh setiap reader).
+WAL_AUTOCHECKPOINT_PAGES = int(os.getenv("DB_WAL_AUTOCHECKPOINT", "1000"))
+JOURNAL_SIZE_LIMIT = int(os.getenv("DB_JOURNAL_SIZE_LIMIT", str(64 * 1024 * 1024)))
 
+
+def open_connection(mode: str = "default", **connect_kwargs) -> sqlite3.Connection:
+    """
+    Opens and configures a new SQLite connection.
+    `mode="tap"` uses short lock timeouts so TAP devices fail fast when the DB is busy.
+    `mode="read"` connections are query_only, for handlers that never write.
+    """
     mode = (mode or "default").lower()
     if mode == "tap":
         timeout_seconds = 1
@@ -28,14 +45,59 @@ def get_db_connection(mode: str = "default"):
         timeout_seconds = 5
         busy_timeout_ms = 5000
 
-    conn = sqlite3.connect(db_file, timeout=timeout_seconds)
+    db_file = get_db_file()
+    conn = sqlite3.connect(db_file, timeout=timeout_seconds, **connect_kwargs)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL;")
+    if db_file not in _wal_enabled_files:
+        conn.execute("PRAGMA journal_mode=WAL;")
+        _wal_enabled_files.add(db_file)
     conn.execute("PRAGMA synchronous = NORMAL;")
     conn.execute(f"PRAGMA busy_timeout = {busy_timeout_ms};")
+    conn.execute(f"PRAGMA wal_autocheckpoint = {WAL_AUTOCHECKPOINT_PAGES};")
+    conn.execute(f"PRAGMA journal_size_limit = {JOURNAL_SIZE_LIMIT};")
+    if mode == "read":
+        conn.execute("PRAGMA query_only = 1;")
     return conn
 
 
+_last_description = (None, ())
+
+
+def dict_factory(cursor: sqlite3.Cursor, row: tuple) -> dict:
+    """
+    Row factory that returns plain dicts, for list endpoints that serialize rows as-is.
+    Set it per cursor (`cursor.row_factory = dict_factory`); other code relies on
+    sqlite3.Row index access. Column names are reused while the description is the same.
+    """
+    global _last_description
+    description = cursor.description
+    cached_description, names = _last_description
+    if cached_description is not description:
+        names = tuple(column[0] for column in description)
+        _last_description = (description, names)
+    return dict(zip(names, row))
+
+
+def ensure_planner_stats(conn: sqlite3.Connection) -> None:
+    """
+    Makes sure the query planner has index statistics (sqlite_stat1).
+    Without them SQLite guesses selectivity and may pick a date-only index for
+    tenant/card/employee + date lookups. Runs a full ANALYZE once; afterwards
+    PRAGMA optimize only re-analyzes tables that changed significantly.
+    """
+    has_stats = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'"
+    ).fetchone()
+    conn.execute("PRAGMA optimize" if has_stats else "ANALYZE")
+    if conn.in_transaction:
+        conn.commit()
+
+
+def get_db_connection(mode: str = "default"):
+    """Establishes a connection to the SQLite database."""
+    return open_connection(mode)
+
+
 def create_tables(fresh: bool = False):
     """Creates all necessary tables in the database if they don't exist."""
     conn = get_db_connection()
@@ -210,6 +272,49 @@ def create_tables(fresh: bool = False):
         ON transactions (card_number, transaction_date)
     """
     )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_date_group
+        ON transactions (transaction_date, employee_group)
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_employees_employee_id
+        ON employees (employee_id)
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_employee_date
+        ON transactions (employee_id, transaction_date)
+    """
+    )
+    # Covering index untuk daftar pegawai export (ORDER BY name tanpa temp b-tree).
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_employees_cover
+        ON employees (name, employee_id, employee_group)
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_preorders_employee_date
+        ON preorders (employee_id, order_date)
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_tenant_menu_tenant
+        ON tenant_menu (tenant_id)
+    """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_devices_code
+        ON devices (device_code)
+    """
+    )
 
     cursor.execute(
         """
@@ -228,6 +333,9 @@ def create_tables(fresh: bool = False):
         """
     )
 
+    conn.commit()
+    # Statistik baru agar planner memilih index komposit (tenant/card/employee + tanggal).
+    cursor.execute("ANALYZE")
     conn.commit()
     conn.close()
     print("Database and tables created successfully.")
@@ -317,7 +425,8 @@ def _ensure_transactions_timestamp_schema(cursor):
 
 def _ensure_transaction_day_schema(cursor):
     """
-    Adds transaction_day column and unique index for (card_number, transaction_day).
+    Adds transaction_day column, unique index for (card_number, transaction_day)
+    and the (tenant_id, transaction_day) index used by the TAP quota count.
     """
     cursor.execute(
         "SELECT name FROM sqlite_master WHERE type='table' AND name='transactions'"
@@ -350,6 +459,12 @@ def _ensure_transaction_day_schema(cursor):
         ON transactions (card_number, transaction_day)
         """
     )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_tenant_day
+        ON transactions (tenant_id, transaction_day)
+        """
+    )
 
 
 if __name__ == "__main__":
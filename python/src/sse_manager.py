@@ -1,44 +1,89 @@
 import asyncio
+import itertools
 import json
+import os
 import time
-from typing import List
+from collections import deque
+from typing import Any, Deque, Optional, Tuple
+
+from .log_buffer import tap_log
 
 main_event_loop = None
-connections: List[asyncio.Queue] = []
+
+# Ring buffer bersama untuk semua subscriber: publish O(1) berapa pun jumlah client.
+# Tiap client menyimpan nomor urut terakhir yang sudah dikirim; client yang tertinggal
+# lebih dari SSE_BUFFER_SIZE event akan melewatkan event terlama.
+# Frame "data: ...\n\n" di-encode sekali saat enqueue, bukan sekali per client.
+_buffer: Deque[Tuple[int, str, Any]] = deque(
+    maxlen=int(os.getenv("SSE_BUFFER_SIZE", "1024"))
+)
+_next_seq = 0
+_ready: Optional[asyncio.Event] = None
+subscriber_count = 0
+
+
+def _ready_event() -> asyncio.Event:
+    global _ready
+    if _ready is None:
+        _ready = asyncio.Event()
+    return _ready
+
+
+def enqueue(data: dict) -> None:
+    """Appends an SSE event to the shared ring buffer. Must run on the main event loop."""
+    global _next_seq, _ready
+    tap_id = data.get("tap_id") if isinstance(data, dict) else None
+    _buffer.append((_next_seq, f"data: {json.dumps(data)}\n\n", tap_id))
+    _next_seq += 1
+    ready = _ready
+    _ready = None
+    if ready is not None:
+        ready.set()
 
 
-async def trigger_sse_event_async(data: dict):
-    """Asynchronously triggers an SSE event to all connected clients."""
-    for q in connections:
-        await q.put(data)
+def publish(data: dict) -> bool:
+    """
+    Thread-safe SSE broadcast from sync handlers: one call_soon_threadsafe hop,
+    no coroutine/Task allocation per event.
+    """
+    loop = main_event_loop
+    if loop is None:
+        return False
+    loop.call_soon_threadsafe(enqueue, data)
+    return True
 
 
 async def event_stream(request, keepalive_interval: int = 15):
     """Generator function for the SSE stream with keepalive to prevent idle disconnects."""
-    q = asyncio.Queue()
-    connections.append(q)
+    global subscriber_count
+    last_seen = _next_seq
+    subscriber_count += 1
     try:
         while True:
-            try:
-                data = await asyncio.wait_for(q.get(), timeout=keepalive_interval)
-            except asyncio.TimeoutError:
-                if await request.is_disconnected():
-                    break
-                yield ": keepalive\n\n"
-                continue
+            if last_seen == _next_seq:
+                try:
+                    await asyncio.wait_for(
+                        _ready_event().wait(), timeout=keepalive_interval
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
 
             if await request.is_disconnected():
                 break
 
-            json_data = json.dumps(data)
-            tap_id = None
-            if isinstance(data, dict):
-                tap_id = data.get("tap_id")
-            log_tap = tap_id or "N/A"
-            print(f"[SSE] sent event tap_id={log_tap} ts={int(time.time() * 1000)}")
-            yield f"data: {json_data}\n\n"
+            pending = min(_next_seq - last_seen, len(_buffer))
+            events = list(itertools.islice(_buffer, len(_buffer) - pending, None))
+            last_seen = _next_seq
+            for _, frame, tap_id in events:
+                # Log lewat LogBuffer: tidak ada write stdout sinkron per client di event loop.
+                tap_log.write(
+                    f"[SSE] sent event tap_id={tap_id or 'N/A'} ts={int(time.time() * 1000)}"
+                )
+                yield frame
     except asyncio.CancelledError:
         print("Client disconnected.")
     finally:
-        if q in connections:
-            connections.remove(q)
+        subscriber_count -= 1
@@ -0,0 +1,122 @@
+import asyncio
+from typing import Any, Callable, List, Optional, Tuple
+
+# (job, asyncio.Future) yang menunggu hasil job tersebut.
+BatchItem = Tuple[Any, asyncio.Future]
+
+# Penanda di antrian dari stop(): worker menyelesaikan batch terakhir lalu berhenti.
+_STOP = object()
+
+
+class TapBatcher:
+    """
+    Groups /tap writes that arrive close together into a single DB transaction.
+
+    Producers `await run()` from async handlers on the batcher's loop. One worker
+    task on that loop drains up to `max_batch` jobs, waiting at most `max_wait_ms`
+    after the first one, and hands the batch to `process_batch` in a worker thread.
+    `process_batch` must return one result per job, in order; a result that is an
+    exception is raised to that caller.
+
+    `stop()` drains instead of cancelling: new jobs are refused (`running` turns
+    False), jobs already queued are still written, and every future is resolved
+    before the worker exits.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        self.process_batch = process_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._accepting = False
+        self._stop_seen = False
+
+    @property
+    def running(self) -> bool:
+        return (
+            self._accepting and self._worker is not None and not self._worker.done()
+        )
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._stop_seen = False
+        self._accepting = True
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._accepting = False
+        worker = self._worker
+        self._worker = None
+        if worker is not None and not worker.done():
+            self._queue.put_nowait(_STOP)
+            await worker
+        if self._queue is not None:
+            # Hanya terjadi bila worker mati karena error tak terduga.
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not _STOP and not item[1].done():
+                    item[1].set_exception(RuntimeError("TapBatcher stopped."))
+        self._loop = None
+
+    async def run(self, job: Any) -> Any:
+        """Enqueue a job from the batcher's own event loop and await its result."""
+        if not self._accepting:
+            raise RuntimeError("TapBatcher is not running.")
+        future = self._loop.create_future()
+        self._queue.put_nowait((job, future))
+        return await future
+
+    async def _next_item(self, timeout: Optional[float] = None) -> Optional[BatchItem]:
+        if timeout is None:
+            item = await self._queue.get()
+        elif timeout <= 0:
+            item = self._queue.get_nowait()
+        else:
+            item = await asyncio.wait_for(self._queue.get(), timeout)
+        if item is _STOP:
+            self._stop_seen = True
+            return None
+        return item
+
+    async def _collect(self) -> List[BatchItem]:
+        batch: List[BatchItem] = []
+        first = await self._next_item()
+        if first is None:
+            return batch
+        batch.append(first)
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                item = await self._next_item(deadline - self._loop.time())
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+
+    async def _run(self) -> None:
+        while not self._stop_seen:
+            batch = await self._collect()
+            if not batch:
+                continue
+            jobs = [job for job, _ in batch]
+            try:
+                results = await asyncio.to_thread(self.process_batch, jobs)
+            except Exception as exc:
+                results = [exc] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
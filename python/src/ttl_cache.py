@@ -0,0 +1,48 @@
+import threading
+import time
+from typing import Any, Dict, Hashable, Tuple
+
+
+class TTLCache:
+    """
+    Cache in-process sederhana: tiap entry kedaluwarsa setelah `ttl` detik.
+    Aman dipakai dari beberapa thread (handler FastAPI berjalan di threadpool).
+    Bila penuh, entry yang kedaluwarsa dibuang dulu lalu entry tertua.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 60.0):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            with self._lock:
+                if self._data.get(key) is entry:
+                    del self._data[key]
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._data.pop(key, None)
+            if len(self._data) >= self.maxsize:
+                for stale_key in [k for k, (exp, _) in self._data.items() if exp <= now]:
+                    del self._data[stale_key]
+                while len(self._data) >= self.maxsize:
+                    del self._data[next(iter(self._data))]
+            self._data[key] = (now + self.ttl, value)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_FILE", os.path.join(tempfile.mkdtemp(), "test.db"))
+
+from src.api_routes import _sync_tenant_menu  # noqa: E402
+
+TENANT_ID = 1
+
+
+class SyncTenantMenuTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(
+            """
+            CREATE TABLE tenant_menu (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tenant_id INTEGER NOT NULL,
+                menu TEXT NOT NULL
+            )
+            """
+        )
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _set(self, menu):
+        _sync_tenant_menu(self.conn.cursor(), TENANT_ID, menu)
+        self.conn.commit()
+
+    def _rows(self):
+        return self.conn.execute(
+            "SELECT id, menu FROM tenant_menu WHERE tenant_id = ? ORDER BY id",
+            (TENANT_ID,),
+        ).fetchall()
+
+    def _menu(self):
+        return [row["menu"] for row in self._rows()]
+
+    def test_unchanged_menu_is_not_rewritten(self):
+        self._set(["Nasi", "Mie"])
+        ids = [row["id"] for row in self._rows()]
+        self._set(["Nasi", "Mie"])
+        self.assertEqual([row["id"] for row in self._rows()], ids)
+
+    def test_reorder_keeps_submitted_order(self):
+        self._set(["Nasi", "Mie"])
+        self._set(["Mie", "Nasi", "Ayam"])
+        self.assertEqual(self._menu(), ["Mie", "Nasi", "Ayam"])
+
+    def test_append_and_remove_keep_existing_rows(self):
+        self._set(["Nasi", "Mie", "Soto"])
+        nasi_id, _, soto_id = [row["id"] for row in self._rows()]
+        self._set(["Nasi", "Soto", "Ayam"])
+        rows = self._rows()
+        self.assertEqual([row["menu"] for row in rows], ["Nasi", "Soto", "Ayam"])
+        self.assertEqual([row["id"] for row in rows[:2]], [nasi_id, soto_id])
+
+    def test_duplicate_items_are_kept(self):
+        self._set(["Nasi", "Nasi", "Mie"])
+        self.assertEqual(self._menu(), ["Nasi", "Nasi", "Mie"])
+        self._set(["Nasi", "Mie"])
+        self.assertEqual(self._menu(), ["Nasi", "Mie"])
+        self._set(["Mie", "Nasi", "Mie"])
+        self.assertEqual(self._menu(), ["Mie", "Nasi", "Mie"])
+
+    def test_empty_menu_clears_rows(self):
+        self._set(["Nasi", "Mie"])
+        self._set([])
+        self.assertEqual(self._menu(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
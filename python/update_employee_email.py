@@ -1,6 +1,6 @@
-import sqlite3
 from typing import Dict, Optional
 
+from src import db_pool
 from src.sqlite_database import get_db_connection
 
 # Mapping dummy untuk testing lokal / sementara.
@@ -21,8 +21,7 @@ def update_employee_email(employee_id: str) -> Optional[str]:
     if not employee_id:
         return None
 
-    conn = get_db_connection()
-    try:
+    with db_pool.get_conn() as conn:
         cursor = conn.cursor()
         cursor.execute(
             """
@@ -51,8 +50,6 @@ def update_employee_email(employee_id: str) -> Optional[str]:
             conn.commit()
             return dummy_email
         return None
-    finally:
-        conn.close()
 
 
 def update_dummy_emails() -> int: